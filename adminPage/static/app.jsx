@@ -30,8 +30,15 @@ const App = () => {
   const scanNetworks = async () => {
     setScanning(true);
     try {
-      const response = await fetch('/api/scan');
-      const data = await response.json();
+      let response = await fetch('/api/scan');
+      let data = await response.json();
+      setNetworks(data.networks || []);
+      // The scan runs in the background; poll until it finishes (up to ~30s)
+      for (let i = 0; data.status === 'running' && i < 120; i++) {
+        await new Promise(resolve => setTimeout(resolve, 250));
+        response = await fetch('/api/scan/result');
+        data = await response.json();
+      }
       setNetworks(data.networks || []);
     } catch (error) {
       console.error('Error scanning networks:', error);
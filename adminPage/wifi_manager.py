@@ -1,12 +1,24 @@
 #!/usr/bin/env python3
 from bluepy.btle import Scanner, DefaultDelegate
-from flask import Flask, jsonify, render_template, request, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory
+from flask_caching import Cache
+from flask_compress import Compress
 import subprocess
 import logging
+import array
+import fcntl
+import gzip
+import hashlib
 import os
+import re
+import shlex
+import shutil
+import socket
+import struct
 import json
 import time
 from datetime import datetime
+from operator import itemgetter
 from typing import List, Dict, Tuple
 from werkzeug.utils import secure_filename
 import queue
@@ -17,7 +29,7 @@ LOG_PATH = '/var/log/scale-reader/web.log'
 WPA_SUPPLICANT_PATH = '/etc/wpa_supplicant/wpa_supplicant.conf'
 CONFIG_PATH = '/home/amitash/certs/config.json'
 CERT_UPLOAD_DIR = '/home/amitash/certs'
-REQUIRED_CERTS = ['device.cert.pem', 'device.private.key', 'root-CA.crt', 'config.json']
+REQUIRED_CERTS = frozenset(['device.cert.pem', 'device.private.key', 'root-CA.crt', 'config.json'])
 
 # Configure logging
 logging.basicConfig(
@@ -92,96 +104,197 @@ app = Flask(__name__,
     static_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
 )
 
+# In-process cache so page loads and refresh clicks don't re-run iwlist/iwgetid
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache'})
+Compress(app)
+
 def set_config(config):
     """Set scale configuration"""
     try:
         with open(CONFIG_PATH, 'w') as f:
             json.dump(config, f)
             logging.info(f"Configuration saved: {config}")
+        cache.delete('scale_config')
     except Exception as e:
         logging.error(f"Error saving configuration: {e}")
 
+_config_cache = {'key': None, 'data': {}}
+
 def get_config() -> Dict[str, str]:
     """Get scale configuration"""
     try:
-        if not os.path.exists(CONFIG_PATH):
+        try:
+            st = os.stat(CONFIG_PATH)
+        except FileNotFoundError:
             logging.warning(f"Config file not found at {CONFIG_PATH}")
             return {}
-            
-        with open(CONFIG_PATH, 'r') as f:
-            config = json.load(f)
+        
+        # Only re-parse when the file has changed since the last read
+        key = (st.st_mtime_ns, st.st_size)
+        if key != _config_cache['key']:
+            with open(CONFIG_PATH, 'r') as f:
+                config = json.load(f)
             # Remove sensitive information
+            config.pop('id_token', None)
             logging.info(f"Configuration read successfully: {config}")
-            if 'id_token' in config:
-                del config['id_token']
-            return config
+            _config_cache['key'] = key
+            _config_cache['data'] = config
+        # Callers update and save the dict, so never hand out the cached one
+        return dict(_config_cache['data'])
     except Exception as e:
         logging.error(f"Error reading config: {e}")
         return {}
 
+# One pass over scan output picks out each access point's signal and SSID.
+# `iw` reports signal in dBm; the legacy iwlist reports a Quality=x/y ratio.
+_IW_SCAN_RE = re.compile(r'^\s*signal: (?P<dbm>-?\d+(?:\.\d+)?) dBm|^\s*SSID: (?P<ssid>.*)$', re.M)
+_SCAN_RE = re.compile(r'Quality=(?P<num>\d+)/(?P<den>\d+)|ESSID:"(?P<ssid>[^"]*)"')
+_SSID_ESCAPE_RE = re.compile(r'\\x([0-9a-fA-F]{2})')
+
+def _unescape_ssid(ssid: str) -> str:
+    """Decode the \\xNN escapes iw/iwlist use for non-printable (e.g. UTF-8) SSID bytes"""
+    if '\\x' not in ssid:
+        return ssid
+    raw = _SSID_ESCAPE_RE.sub(lambda m: chr(int(m.group(1), 16)), ssid)
+    return raw.encode('latin-1', 'replace').decode('utf-8', 'replace')
+
 def scan_networks() -> List[Dict[str, str]]:
     """Scan for available WiFi networks"""
     try:
-        # Scan for networks
-        subprocess.run(['iwlist', 'wlan0', 'scan'], capture_output=True)
-        result = subprocess.run(
-            ['iwlist', 'wlan0', 'scan'], 
-            capture_output=True, 
-            text=True
-        )
+        # Prefer iw's structured output; fall back to iwlist if iw is missing or refuses
+        try:
+            result = subprocess.run(
+                ['iw', 'dev', 'wlan0', 'scan'],
+                capture_output=True,
+                text=True,
+                timeout=10  # don't let a wedged radio stall the scanner thread
+            )
+            use_iw = result.returncode == 0
+        except (FileNotFoundError, subprocess.TimeoutExpired) as e:
+            logging.warning(f"iw scan failed, falling back to iwlist: {e}")
+            use_iw = False
+        if not use_iw:
+            result = subprocess.run(
+                ['iwlist', 'wlan0', 'scan'], 
+                capture_output=True, 
+                text=True,
+                timeout=10
+            )
         
-        networks = []
-        current_network = {}
+        # The signal precedes the SSID for each access point; keep the strongest per SSID
+        best = {}
+        strength = 0
         
-        for line in result.stdout.split('\n'):
-            line = line.strip()
-            
-            if 'ESSID:' in line:
-                ssid = line.split('ESSID:')[1].strip('"')
-                if ssid and current_network:
-                    current_network['ssid'] = ssid
-                    networks.append(current_network)
-                    current_network = {}
-                elif ssid:
-                    current_network = {'ssid': ssid}
-                    
-            elif 'Quality=' in line:
-                try:
-                    quality = line.split('Quality=')[1].split(' ')[0]
-                    level = int(quality.split('/')[0]) / int(quality.split('/')[1]) * 100
-                    current_network['signal_strength'] = round(level)
-                except:
-                    current_network['signal_strength'] = 0
+        for m in (_IW_SCAN_RE if use_iw else _SCAN_RE).finditer(result.stdout):
+            ssid = m.group('ssid')
+            if ssid is None:
+                if use_iw:
+                    # Map -100..-50 dBm onto 0..100%
+                    strength = min(100, max(0, round(2 * (float(m.group('dbm')) + 100))))
+                else:
+                    den = int(m.group('den'))
+                    strength = round(int(m.group('num')) / den * 100) if den else 0
+            else:
+                ssid = _unescape_ssid(ssid)
+                # Hidden networks show up as empty or all-NUL SSIDs
+                if ssid.strip('\0'):
+                    prev = best.get(ssid)
+                    if prev is None or strength > prev:
+                        best[ssid] = strength
+                strength = 0
         
-        # Remove duplicates and sort by signal strength
-        unique_networks = {network['ssid']: network for network in networks}.values()
-        return sorted(unique_networks, key=lambda x: x['signal_strength'], reverse=True)
+        return sorted(
+            ({'ssid': ssid, 'signal_strength': signal} for ssid, signal in best.items()),
+            key=itemgetter('signal_strength'),
+            reverse=True
+        )
         
     except Exception as e:
         logging.error(f"Error scanning networks: {e}")
         return []
 
+SCAN_REFRESH_INTERVAL = 15
+
+# ioctls used to read the WiFi status without spawning iwgetid/ip
+SIOCGIFADDR = 0x8915
+SIOCGIWESSID = 0x8B1B
+IW_ESSID_MAX_SIZE = 32
+
+# First IPv4 address in `ip addr show` output
+_IP_RE = re.compile(rb'inet (\S+?)/')
+
+_scan_lock = threading.Lock()
+_scan_cache = {'ts': 0, 'nets': []}
+_scan_wake = threading.Event()
+_scan_busy = threading.Event()
+_scan_thread = None
+
+def _scan_worker():
+    """Refresh _scan_cache when woken, at most once per SCAN_REFRESH_INTERVAL"""
+    global _scan_cache
+    while True:
+        _scan_wake.wait()
+        # Set busy before clearing wake so _scan_pending() never sees a gap
+        _scan_busy.set()
+        _scan_wake.clear()
+        nets = scan_networks()
+        with _scan_lock:
+            _scan_cache = {'ts': time.time(), 'nets': nets}
+        _scan_busy.clear()
+        time.sleep(SCAN_REFRESH_INTERVAL)
+
+def _scan_pending() -> bool:
+    """Return True while a requested scan has not finished yet"""
+    return _scan_wake.is_set() or _scan_busy.is_set()
+
+def _invalidate_scan():
+    """Mark the last scan stale so the next /api/scan triggers a fresh one"""
+    global _scan_cache
+    with _scan_lock:
+        _scan_cache = {'ts': 0, 'nets': _scan_cache['nets']}
+
+def _start_scan_worker():
+    """Start the background scanner on first use"""
+    global _scan_thread
+    with _scan_lock:
+        if _scan_thread is None:
+            _scan_thread = threading.Thread(target=_scan_worker, daemon=True)
+            _scan_thread.start()
+
+def _wifi_ssid(ifname: str) -> str:
+    """Return the ESSID ifname is associated with ('' if none) via SIOCGIWESSID"""
+    buf = array.array('B', bytes(IW_ESSID_MAX_SIZE + 1))
+    addr, _ = buf.buffer_info()
+    # struct iwreq: interface name followed by an iw_point {pointer, length, flags}
+    req = struct.pack('16sPHH', ifname.encode(), addr, len(buf), 0).ljust(32, b'\0')
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        res = fcntl.ioctl(s.fileno(), SIOCGIWESSID, req)
+    length = struct.unpack_from('16sPHH', res)[2]
+    return buf.tobytes()[:length].rstrip(b'\0').decode('utf-8', 'replace')
+
+def _wifi_ip(ifname: str) -> str:
+    """Return the IPv4 address of ifname via SIOCGIFADDR"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        res = fcntl.ioctl(s.fileno(), SIOCGIFADDR, struct.pack('256s', ifname.encode()[:15]))
+    return socket.inet_ntoa(res[20:24])
+
 def get_wifi_status() -> Tuple[bool, str, str]:
     """Get current WiFi connection status"""
     try:
-        result = subprocess.run(
-            ['iwgetid', 'wlan0', '-r'], 
-            capture_output=True, 
-            text=True
-        )
+        # Query the kernel directly; fall back to the CLI tools if the ioctls aren't supported
+        try:
+            ssid = _wifi_ssid('wlan0')
+        except OSError:
+            result = subprocess.run(['iwgetid', 'wlan0', '-r'], capture_output=True)
+            ssid = result.stdout.strip().decode('utf-8', 'replace') if result.returncode == 0 else ""
         
-        if result.returncode == 0 and result.stdout.strip():
-            ssid = result.stdout.strip()
-            ip_result = subprocess.run(
-                ['ip', 'addr', 'show', 'wlan0'], 
-                capture_output=True, 
-                text=True
-            )
-            ip_address = "Unknown"
-            for line in ip_result.stdout.split('\n'):
-                if 'inet ' in line:
-                    ip_address = line.split()[1].split('/')[0]
-                    break
+        if ssid:
+            try:
+                ip_address = _wifi_ip('wlan0')
+            except OSError:
+                ip_result = subprocess.run(['ip', 'addr', 'show', 'wlan0'], capture_output=True)
+                match = _IP_RE.search(ip_result.stdout)
+                ip_address = match.group(1).decode('ascii') if match else "Unknown"
             
             logging.info(f"WiFi Status - Connected to {ssid} with IP {ip_address}")
             return True, ssid, ip_address
@@ -192,27 +305,48 @@ def get_wifi_status() -> Tuple[bool, str, str]:
         logging.error(f"Error getting WiFi status: {e}")
         return False, "", ""
 
+# Requests are served on several threads; wlan0 changes must not interleave
+_wifi_lock = threading.Lock()
+
+_DISCONNECT_CMD = ('sudo', '/bin/bash', '/usr/local/bin/wifi-disconnect.sh', '-i', 'wlan0')
+_CONNECT_CMD = ('sudo', '/bin/bash', '/usr/local/bin/connect_to_wifi.sh', '-i', 'wlan0')
+# An SSID is 1-32 bytes; a WPA passphrase is 8-63 printable ASCII characters.
+# Control characters (e.g. newlines) would inject lines into wpa_supplicant.conf.
+_SSID_RE = re.compile(r'\A[^\x00-\x1f\x7f]{1,32}\Z')
+_PASSPHRASE_RE = re.compile(r'\A[\x20-\x7e]{8,63}\Z')
+
+def _validate_credentials(ssid, password) -> str:
+    """Return an error message if the SSID or passphrase can't be used, else ''"""
+    if not isinstance(ssid, str) or not _SSID_RE.match(ssid) or len(ssid.encode('utf-8')) > 32:
+        return "Invalid SSID"
+    if not isinstance(password, str) or not _PASSPHRASE_RE.match(password):
+        return "Password must be 8-63 printable ASCII characters"
+    return ""
+
 def connect_to_network(ssid: str, password: str) -> Tuple[bool, str]:
     """Connect to a WiFi network"""
+    error_msg = _validate_credentials(ssid, password)
+    if error_msg:
+        logging.error(f"Rejected connect request: {error_msg}")
+        return False, error_msg
+    
     try:
         logging.info(f"Attempting to connect to network: {ssid}")
         
         # First disconnect from any existing connection
         result = subprocess.run(
-            ['sudo', '/bin/bash', '/usr/local/bin/wifi-disconnect.sh', '-i', 'wlan0'],
+            _DISCONNECT_CMD,
             capture_output=True,
-            text=True
+            text=True,
+            timeout=30
         )
-        time.sleep(2)
         
-        # Connect using the script
+        # Connect using the script; it waits up to 15s to associate plus DHCP
         result = subprocess.run(
-            ['sudo', '/bin/bash', '/usr/local/bin/connect_to_wifi.sh',
-             '-i', 'wlan0',
-             '-s', ssid,
-             '-p', password],
+            _CONNECT_CMD + ('-s', ssid, '-p', password),
             capture_output=True,
-            text=True
+            text=True,
+            timeout=90
         )
         
         if result.returncode == 0:
@@ -222,9 +356,10 @@ def connect_to_network(ssid: str, password: str) -> Tuple[bool, str]:
             wifi_store_dir = '/etc/scale-reader/wifi'
             os.makedirs(wifi_store_dir, exist_ok=True)
             
+            # wifi_reconnect.sh sources this file as root, so quote the values for the shell
             with open(f'{wifi_store_dir}/last_connection.conf', 'w') as f:
-                f.write(f'SSID="{ssid}"\n')
-                f.write(f'PASSWORD="{password}"\n')
+                f.write(f'SSID={shlex.quote(ssid)}\n')
+                f.write(f'PASSWORD={shlex.quote(password)}\n')
             
             os.chmod(f'{wifi_store_dir}/last_connection.conf', 0o600)
             
@@ -250,9 +385,10 @@ def disconnect_wifi() -> Tuple[bool, str]:
             pass
             
         result = subprocess.run(
-            ['sudo', '/bin/bash', '/usr/local/bin/wifi-disconnect.sh', '-i', 'wlan0'],
+            _DISCONNECT_CMD,
             capture_output=True,
-            text=True
+            text=True,
+            timeout=30
         )
         
         if result.returncode == 0:
@@ -267,36 +403,101 @@ def disconnect_wifi() -> Tuple[bool, str]:
         logging.error(f"Error disconnecting WiFi: {error_msg}")
         return False, error_msg
 
+_index_cache = {'key': None, 'plain': b'', 'gzip': b''}
+_INDENT_RE = re.compile(rb'\n\s+')
+
+def _index_bodies():
+    """Return index.html minified and pre-gzipped, re-reading only when the file changes"""
+    path = os.path.join(app.template_folder, 'index.html')
+    st = os.stat(path)
+    key = (st.st_mtime_ns, st.st_size)
+    if key != _index_cache['key']:
+        with open(path, 'rb') as f:
+            # Drop indentation and blank lines; newlines are kept so inline JS comments stay safe
+            plain = _INDENT_RE.sub(b'\n', f.read())
+        _index_cache.update(key=key, plain=plain, gzip=gzip.compress(plain, 9))
+    return _index_cache
+
 @app.route('/')
 def index():
     """Serve the main page"""
     logging.info("Serving main page")
-    return render_template('index.html')
+    # index.html has no template variables, so serve precompressed bytes and let ETags give 304s
+    bodies = _index_bodies()
+    use_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    response = Response(bodies['gzip'] if use_gzip else bodies['plain'], mimetype='text/html')
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    mtime_ns, size = bodies['key']
+    response.set_etag(f"{mtime_ns:x}-{size:x}-{'gz' if use_gzip else 'id'}")
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    return response.make_conditional(request)
 
 @app.route('/api/config')
+@cache.cached(timeout=5, key_prefix='scale_config')
 def config():
     """Get scale configuration"""
     logging.info("Getting configuration")
     return jsonify(get_config())
 
-@app.route('/api/status')
-def status():
-    """Get current WiFi status"""
+@cache.cached(timeout=2, key_prefix='wifi_status')
+def _wifi_status_payload() -> Dict[str, str]:
+    """Current WiFi status as the /api/status payload, cached briefly across requests"""
     connected, ssid, ip = get_wifi_status()
     logging.info(f"Status check - Connected: {connected}, SSID: {ssid}, IP: {ip}")
-    return jsonify({
+    return {
         'connected': connected,
         'ssid': ssid,
         'ip': ip
-    })
+    }
+
+@app.route('/api/status')
+def status():
+    """Get current WiFi status"""
+    data = _wifi_status_payload()
+    response = jsonify(data)
+    # Unchanged status answers a conditional GET with an empty 304
+    response.set_etag(hashlib.md5(f"{data['connected']}|{data['ssid']}|{data['ip']}".encode()).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = 2
+    return response.make_conditional(request)
+
+def _scan_response():
+    """Build the scan JSON: the last result plus whether a newer one is on its way"""
+    with _scan_lock:
+        cached = _scan_cache
+    # Networks are already sorted strongest-first, so a limit is just a slice
+    nets = cached['nets']
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit >= 0:
+        nets = nets[:limit]
+    # no-cache: /api/scan may start a scan, so every request has to reach the server
+    if _scan_pending():
+        response = jsonify({'status': 'running', 'networks': nets})
+        response.status_code = 202
+        response.cache_control.no_cache = True
+        return response
+    response = jsonify({'status': 'done', 'networks': nets})
+    response.set_etag(f"{int(cached['ts'] * 1000):x}-{limit}")
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route('/api/scan')
 def scan():
-    """Scan for available networks"""
-    logging.info("Starting network scan")
-    networks = scan_networks()
-    logging.info(f"Network scan complete - found {len(networks)} networks")
-    return jsonify({'networks': networks})
+    """Start a background scan if the last one is stale and return without waiting"""
+    _start_scan_worker()
+    with _scan_lock:
+        cached = _scan_cache
+    if request.args.get('force') or time.time() - cached['ts'] > SCAN_REFRESH_INTERVAL:
+        _scan_wake.set()
+    return _scan_response()
+
+@app.route('/api/scan/result')
+def scan_result():
+    """Poll for the outcome of a scan started by /api/scan"""
+    return _scan_response()
 
 @app.route('/api/connect', methods=['POST'])
 def connect():
@@ -307,7 +508,10 @@ def connect():
         return jsonify({'success': False, 'error': 'Missing required fields'})
     
     logging.info(f"Attempting to connect to network: {data['ssid']}")
-    success, error = connect_to_network(data['ssid'], data['password'])
+    with _wifi_lock:
+        success, error = connect_to_network(data['ssid'], data['password'])
+    cache.delete('wifi_status')
+    _invalidate_scan()
     return jsonify({
         'success': success,
         'error': error
@@ -317,7 +521,10 @@ def connect():
 def disconnect():
     """Disconnect from current network"""
     logging.info("Disconnecting from WiFi")
-    success, error = disconnect_wifi()
+    with _wifi_lock:
+        success, error = disconnect_wifi()
+    cache.delete('wifi_status')
+    _invalidate_scan()
     return jsonify({
         'success': success,
         'error': error
@@ -391,7 +598,7 @@ def check_certificates():
         missing_certs = []
         found_certs = []
         
-        for cert in REQUIRED_CERTS:
+        for cert in sorted(REQUIRED_CERTS):
             cert_path = os.path.join(CERT_UPLOAD_DIR, cert)
             if not os.path.exists(cert_path):
                 missing_certs.append(cert)
@@ -424,12 +631,11 @@ def upload_certificates():
             })
 
         files = request.files.getlist('certificates')
-        uploaded_files = [f.filename for f in files]
-        logging.info(f"Received certificate files: {', '.join(uploaded_files)}")
+        uploaded_files = {f.filename for f in files}
+        logging.info(f"Received certificate files: {', '.join(sorted(uploaded_files))}")
         
         # Verify all required certificates are present
-        missing_certs = [cert for cert in REQUIRED_CERTS 
-                        if cert not in uploaded_files]
+        missing_certs = sorted(REQUIRED_CERTS - uploaded_files)
         
         if missing_certs:
             missing_msg = f"Missing required certificates: {', '.join(missing_certs)}"
@@ -447,12 +653,17 @@ def upload_certificates():
             if file.filename in REQUIRED_CERTS:
                 filename = secure_filename(file.filename)
                 filepath = os.path.join(CERT_UPLOAD_DIR, filename)
-                file.save(filepath)
-                # Set proper permissions
-                os.chmod(filepath, 0o600)
-                os.chown(filepath, 0, 0)  # root:root
+                # Restrict permissions before any data is written so the key is never exposed
+                fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                with os.fdopen(fd, 'wb') as out:
+                    os.fchmod(fd, 0o600)  # O_CREAT's mode doesn't apply to an existing file
+                    os.fchown(fd, 0, 0)  # root:root
+                    shutil.copyfileobj(file.stream, out, 1 << 16)
                 logging.info(f"Saved certificate: {filename}")
 
+        # config.json may have just been replaced
+        cache.delete('scale_config')
+
         return jsonify({
             'success': True,
             'message': 'Certificates uploaded successfully'
@@ -654,7 +865,7 @@ def get_logs():
             logging.error(f"Error reading application logs: {e}")
 
         # Sort logs by timestamp (roughly)
-        logs.sort(key=lambda x: x['timestamp'], reverse=True)
+        logs.sort(key=itemgetter('timestamp'), reverse=True)
         
         # Add some test logs if no logs are found
         if not logs:
@@ -696,7 +907,7 @@ def get_measurements():
                         continue
 
         # Sort measurements by timestamp, most recent first
-        measurements.sort(key=lambda x: x['timestamp'], reverse=True)
+        measurements.sort(key=itemgetter('timestamp'), reverse=True)
         
         return jsonify({
             'success': True,
@@ -828,8 +1039,9 @@ if __name__ == '__main__':
         else:
             logging.error(f"Template file not found at {template_path}")
 
-        # Run the server
-        app.run(host='0.0.0.0', port=80, debug=True)
+        # Run under waitress so a slow request (e.g. a Bluetooth scan) doesn't block the rest
+        from waitress import serve
+        serve(app, host='0.0.0.0', port=80, threads=4, connection_limit=32)
     except Exception as e:
         logging.error(f"Fatal error during startup: {str(e)}")
         raise
\ No newline at end of file
@@ -3,12 +3,30 @@
 import boto3
 import json
 import os
+import shutil
 import argparse
+import urllib.request
 from botocore.exceptions import ClientError
 
-def provision_device(device_id: str, output_dir: str, policy_name: str, stage: str):
+ROOT_CA_URL = "https://www.amazontrust.com/repository/AmazonRootCA1.pem"
+
+_SESSION = None
+
+def _session():
+    """Return a process-wide boto3 session, created on first use"""
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = boto3.session.Session()
+    return _SESSION
+
+def get_iot_endpoint(iot) -> str:
+    """Return the ATS data endpoint for this account"""
+    return iot.describe_endpoint(endpointType='iot:Data-ATS')['endpointAddress']
+
+def provision_device(device_id: str, output_dir: str, policy_name: str, stage: str, iot=None):
     """Provision a new device in AWS IoT"""
-    iot = boto3.client('iot')
+    if iot is None:
+        iot = _session().client('iot')
     
     try:
         # Create thing
@@ -40,7 +58,9 @@ def provision_device(device_id: str, output_dir: str, policy_name: str, stage: s
             
         # Download root CA
         print("Downloading root CA certificate...")
-        os.system(f"curl https://www.amazontrust.com/repository/AmazonRootCA1.pem -o {output_dir}/root-CA.crt")
+        with urllib.request.urlopen(ROOT_CA_URL, timeout=10) as response, \
+                open(f"{output_dir}/root-CA.crt", 'wb') as f:
+            shutil.copyfileobj(response, f)
         
         # Attach policy
         print(f"Attaching policy: {policy_name}")
@@ -61,7 +81,7 @@ def provision_device(device_id: str, output_dir: str, policy_name: str, stage: s
             'device_id': device_id,
             'serial_port': '/dev/ttyUSB0',
             'baud_rate': 1200,
-            'iot_endpoint': iot.describe_endpoint(endpointType='iot:Data-ATS')['endpointAddress'],
+            'iot_endpoint': get_iot_endpoint(iot),
             'stage': stage
 
         }
@@ -89,7 +109,8 @@ def main():
                        help='Deployment stage')
     
     args = parser.parse_args()
-    provision_device(args.device_id, args.output_dir, args.policy_name, args.stage)
+    iot = _session().client('iot')
+    provision_device(args.device_id, args.output_dir, args.policy_name, args.stage, iot)
 
 if __name__ == '__main__':
     main()
@@ -6,6 +6,7 @@ import time
 import json
 import logging
 import random
+import threading
 from datetime import datetime
 from awscrt import io, mqtt
 from awsiot import mqtt_connection_builder
@@ -17,6 +18,21 @@ LOG_PATH = '/tmp/cloud-control.log'
 COMMANDS_TOPIC = "scale-commands"
 STATUS_TOPIC = "scale-status"
 
+# Native event loop reused across reconnects
+_ELG = None
+_BOOT = None
+_BOOT_LOCK = threading.Lock()
+
+def _client_bootstrap():
+    """Return the process-wide ClientBootstrap, creating it on first use"""
+    global _ELG, _BOOT
+    with _BOOT_LOCK:
+        if _BOOT is None:
+            _ELG = io.EventLoopGroup(1)
+            host_resolver = io.DefaultHostResolver(_ELG)
+            _BOOT = io.ClientBootstrap(_ELG, host_resolver)
+        return _BOOT
+
 def setup_logging():
     """Configure logging"""
     os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
@@ -75,15 +91,11 @@ class CloudControl:
     def _create_mqtt_client(self):
         """Create MQTT connection with AWS IoT"""
         try:
-            event_loop_group = io.EventLoopGroup(1)
-            host_resolver = io.DefaultHostResolver(event_loop_group)
-            client_bootstrap = io.ClientBootstrap(event_loop_group, host_resolver)
-            
             mqtt_client = mqtt_connection_builder.mtls_from_path(
                 endpoint=self.config['iot_endpoint'],
                 cert_filepath=f"{CERTS_PATH}/device.cert.pem",
                 pri_key_filepath=f"{CERTS_PATH}/device.private.key",
-                client_bootstrap=client_bootstrap,
+                client_bootstrap=_client_bootstrap(),
                 ca_filepath=f"{CERTS_PATH}/root-CA.crt",
                 client_id=self.client_id,
                 clean_session=True,  # Ensure a clean session on reconnect
@@ -143,7 +155,7 @@ class CloudControl:
             
             self.mqtt.publish(
                 topic=STATUS_TOPIC,
-                payload=json.dumps(status_data),
+                payload=json.dumps(status_data, separators=(",", ":")).encode("utf-8"),
                 qos=mqtt.QoS.AT_LEAST_ONCE
             )
         except Exception as e:
@@ -55,17 +55,19 @@ print_status "SSID: $SSID"
 print_status "Running cleanup..."
 pid=$(pgrep -f "wpa_supplicant.*${INTERFACE}")
 if [ ! -z "$pid" ]; then
-    kill "$pid" || true
-    sleep 2
+    kill $pid || true
+    # Wait (up to 2s) for it to exit rather than sleeping a fixed time
+    for _ in $(seq 20); do
+        pgrep -f "wpa_supplicant.*${INTERFACE}" >/dev/null || break
+        sleep 0.1
+    done
 fi
 
 # Remove control interface for specific interface only
 rm -f "/run/wpa_supplicant/${INTERFACE}" || true
-sleep 1
 
 # Bring interface down
 ip link set "$INTERFACE" down
-sleep 1
 
 # Generate wpa_supplicant configuration
 print_status "Generating wpa_supplicant configuration..."
@@ -90,7 +92,6 @@ chmod 600 "$CONFIG_FILE"
 
 # Bring interface up
 ip link set "$INTERFACE" up
-sleep 1
 
 # Start wpa_supplicant specifically for this interface
 print_status "Starting wpa_supplicant..."
@@ -105,15 +106,16 @@ fi
 
 # Wait for connection
 print_status "Waiting for connection..."
-max_attempts=15
+# Poll every 200ms for up to 15s so we continue as soon as we associate
+max_attempts=75
 attempt=0
 
 while [ $attempt -lt $max_attempts ]; do
     if iw "$INTERFACE" link | grep -q "Connected to"; then
         break
     fi
-    echo -n "."
-    sleep 1
+    [ $((attempt % 5)) -eq 0 ] && echo -n "."
+    sleep 0.2
     attempt=$((attempt + 1))
 done
 echo
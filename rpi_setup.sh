@@ -33,6 +33,19 @@ handle_error() {
     exit 1
 }
 
+# Function to install a systemd unit from stdin, only rewriting it when the content changed
+CHANGED_UNITS=()
+install_unit() {
+    local path="/etc/systemd/system/$1"
+    local content
+    content="$(cat)"
+    if [ -f "$path" ] && [ "$(cat "$path")" == "$content" ]; then
+        return
+    fi
+    printf '%s\n' "$content" > "$path.tmp" && mv "$path.tmp" "$path"
+    CHANGED_UNITS+=("$1")
+}
+
 # Function to verify certificates
 verify_certificates() {
     print_status "Verifying certificates..."
@@ -139,6 +152,9 @@ copy_required_files() {
     cp wifi-disconnect.sh /usr/local/bin/
     cp setup_wifi_connection.sh /usr/local/bin/
     cp scale_reader.py /usr/local/bin/
+    cp scale_core.py /usr/local/bin/
+    cp scale_protocol.py /usr/local/bin/
+    python3 -m compileall -q /usr/local/bin/scale_core.py /usr/local/bin/scale_protocol.py
     cp cloud_control.py /opt/scale-reader/
     cp wifi_manager.py /usr/local/bin/
     
@@ -185,8 +201,12 @@ main() {
     /opt/scale-reader/venv/bin/pip install \
         awsiotsdk \
         pyserial \
+        orjson \
         boto3 \
         flask \
+        flask-caching \
+        flask-compress \
+        waitress \
         requests \
         psutil
     
@@ -194,7 +214,7 @@ main() {
     print_status "Creating systemd services..."
     
     # Scale reader service
-    cat > /etc/systemd/system/scale-reader.service << EOL
+    install_unit scale-reader.service << EOL
 [Unit]
 Description=Scale Reader Service
 After=network.target
@@ -213,7 +233,7 @@ WantedBy=multi-user.target
 EOL
 
     # Cloud control service
-    cat > /etc/systemd/system/cloud-control.service << EOL
+    install_unit cloud-control.service << EOL
 [Unit]
 Description=Cloud Control Service
 After=network.target
@@ -232,10 +252,13 @@ WorkingDirectory=/opt/scale-reader
 WantedBy=multi-user.target
 EOL
 
-    # Enable and start services
-    systemctl daemon-reload
+    # Reload only when a unit changed, but always restart: both services are
+    # long-running, so freshly copied code only takes effect after a restart
+    if [ ${#CHANGED_UNITS[@]} -gt 0 ]; then
+        systemctl daemon-reload
+    fi
     systemctl enable scale-reader.service cloud-control.service
-    systemctl start scale-reader.service cloud-control.service
+    systemctl restart scale-reader.service cloud-control.service
     
     print_success "Setup completed successfully!"
     echo
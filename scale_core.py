@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""Shared configuration, parsing and AWS IoT plumbing for the scale reader"""
+
+import os
+import sys
+import gzip
+import json
+import pickle
+import sqlite3
+import queue
+import atexit
+import logging
+import logging.handlers
+from collections import deque
+import threading
+import time
+import orjson
+from scale_protocol import parse_frame
+
+# Constants
+CONFIG_PATH = '/home/amitash/certs/config.json'
+CERTS_PATH = '/home/amitash/certs'
+CONFIG_CACHE_PATH = '/var/cache/scale-reader/config.pkl'
+QUEUE_DB_PATH = '/var/lib/scale-reader/queue.db'
+SENT_RETENTION_SECS = 7 * 24 * 3600
+# AWS IoT allows up to 100 unacknowledged QoS 1 publishes per connection
+MAX_INFLIGHT = 50
+PUBACK_TIMEOUT = 10
+# Keeps a batched payload well under AWS IoT's 128 KB message limit (~40 bytes per sample)
+MAX_BATCH_SIZE = 1000
+LOG_PATH = '/tmp/scale.log'
+LOG_QUEUE_SIZE = 1000
+STAGE = 'prod'
+TOPIC = f"{STAGE}/{STAGE}/scale-measurements"
+
+# Native event loop shared by every IoTClient in the process
+_ELG = None
+_BOOT = None
+_BOOT_LOCK = threading.Lock()
+
+def _client_bootstrap():
+    """Return the process-wide ClientBootstrap, creating it on first use"""
+    global _ELG, _BOOT
+    from awscrt import io
+    with _BOOT_LOCK:
+        if _BOOT is None:
+            _ELG = io.EventLoopGroup(1)
+            host_resolver = io.DefaultHostResolver(_ELG)
+            _BOOT = io.ClientBootstrap(_ELG, host_resolver)
+        return _BOOT
+
+_TS_MINUTE = None
+_TS_PREFIX = ''
+
+def utc_timestamp(t=None):
+    """Format a Unix time (default now) as an ISO 8601 UTC string"""
+    global _TS_MINUTE, _TS_PREFIX
+    secs = int(time.time() if t is None else t)
+    minute, sec = divmod(secs, 60)
+    # Only rebuild the "YYYY-MM-DDTHH:MM:" prefix when the minute changes
+    if minute != _TS_MINUTE:
+        _TS_PREFIX = time.strftime('%Y-%m-%dT%H:%M:', time.gmtime(secs))
+        _TS_MINUTE = minute
+    return f"{_TS_PREFIX}{sec:02d}Z"
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking or erroring when the queue is full"""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+def setup_logging():
+    """Configure logging; file/stdout writes happen on a background listener thread"""
+    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+    
+    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.FileHandler(LOG_PATH),
+        logging.StreamHandler(sys.stdout)
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    # Bounded so a stalled SD card can't grow memory without limit
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    listener = logging.handlers.QueueListener(log_queue, *handlers)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    # Records are formatted by the listener's handlers, not on enqueue
+    queue_handler = _DroppingQueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        handlers=[queue_handler]
+    )
+
+class ScaleConfig:
+    """Configuration handler for scale reader"""
+    __slots__ = ('config_path', 'data')
+
+    def __init__(self, device, config_path: str = CONFIG_PATH):
+        self.config_path = config_path
+        self.data = self._load_config(device)
+    
+    def _load_config(self, device) -> dict:
+        try:
+            logging.info(f"Loading configuration from {self.config_path}")
+            if not os.path.exists(self.config_path):
+                raise FileNotFoundError(f"Config file not found at {self.config_path}")
+            
+            config = self._read_config()
+            
+            required_fields = [
+                'device_id',
+                'iot_endpoint',
+                'stage',
+            ]
+            if device == 'rs232':
+                required_fields += ['serial_port', 'baud_rate']
+            elif device == 'bluetooth':
+                required_fields += ['bluetooth_mac']
+            
+            missing = [field for field in required_fields if field not in config]
+            if missing:
+                raise ValueError(f"Missing required config fields: {missing}")
+            
+            return config
+                
+        except Exception as e:
+            logging.error(f"Failed to load config: {e}")
+            raise
+
+    def _read_config(self) -> dict:
+        """Read the JSON config, reusing the pickled copy while the file is unchanged"""
+        st = os.stat(self.config_path)
+        key = (self.config_path, st.st_mtime_ns, st.st_size)
+        try:
+            with open(CONFIG_CACHE_PATH, 'rb') as f:
+                cached_key, config = pickle.load(f)
+            if cached_key == key:
+                return config
+        except (OSError, pickle.PickleError, EOFError, ValueError, TypeError):
+            pass
+        
+        with open(self.config_path, 'r') as f:
+            config = json.load(f)
+        
+        try:
+            os.makedirs(os.path.dirname(CONFIG_CACHE_PATH), exist_ok=True)
+            tmp_path = f"{CONFIG_CACHE_PATH}.{os.getpid()}"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((key, config), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, CONFIG_CACHE_PATH)
+        except OSError as e:
+            logging.warning(f"Could not write config cache: {e}")
+        
+        return config
+
+class IoTClient:
+    """Handles communication with AWS IoT"""
+    __slots__ = ('device_id', 'endpoint', 'stage', 'mqtt_connection', '_topic', '_payload_parts',
+                 'batch_size', 'flush_interval', 'compress', '_pub_count')
+
+    def __init__(self, device_id: str, endpoint: str, stage: str = STAGE,
+                 batch_size: int = 1, flush_interval: float = 300, compress: bool = False):
+        self.device_id = device_id
+        self.endpoint = endpoint
+        self.stage = stage
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compress = compress
+        self._pub_count = 0
+        self.mqtt_connection = self._create_mqtt_connection()
+        self._topic = f"{stage}/{stage}/scale-measurements"
+        # Fixed parts of the JSON payload; only the id, weight and timestamp are filled in
+        device_json = orjson.dumps(device_id)
+        self._payload_parts = (
+            b'{"measurement_id":"scale-1-',
+            b'","device_id":' + device_json + b',"scale_id":' + device_json + b',"weight":',
+            b',"timestamp":"',
+            b'","unit":"kg"}'
+        )
+        
+    def _create_mqtt_connection(self):
+        cert_files = {
+            'cert': f"{CERTS_PATH}/device.cert.pem",
+            'key': f"{CERTS_PATH}/device.private.key",
+            'root': f"{CERTS_PATH}/root-CA.crt"
+        }
+        
+        from awsiot import mqtt_connection_builder
+        
+        # Read each file once and hand the bytes over so awscrt doesn't reopen them
+        cert_bytes = {}
+        for name, path in cert_files.items():
+            try:
+                with open(path, 'rb') as f:
+                    cert_bytes[name] = f.read()
+            except FileNotFoundError:
+                raise FileNotFoundError(f"Missing {name} file: {path}")
+        
+        return mqtt_connection_builder.mtls_from_bytes(
+            endpoint=self.endpoint,
+            cert_bytes=cert_bytes['cert'],
+            pri_key_bytes=cert_bytes['key'],
+            client_bootstrap=_client_bootstrap(),
+            ca_bytes=cert_bytes['root'],
+            client_id=f"device-{self.device_id}",
+            clean_session=True,
+            # Pings every 4 minutes stay under typical NAT idle timeouts and bound how
+            # long a half-open link goes unnoticed; the timeout applies once one is sent
+            keep_alive_secs=240,
+            ping_timeout_ms=3000
+        )
+    
+    def connect(self):
+        connect_future = self.mqtt_connection.connect()
+        connect_future.result(timeout=10)
+        logging.info("Connected to AWS IoT")
+    
+    
+    def save_measurement(self, weight, timestamp, uploaded=False):
+        """Save measurement to local file"""
+        measurement = {
+            "weight": weight,
+            "timestamp": timestamp,
+            "unit": "kg",
+            "uploaded": uploaded
+        }
+        
+        # Create directory if it doesn't exist
+        os.makedirs("/tmp/measurements", exist_ok=True)
+        
+        # Save measurement with timestamp as filename
+        filename = f"/tmp/measurements/{timestamp.replace(':', '-')}.json"
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(measurement))
+
+    def publish_measurement(self, weight: float, t=None):
+        """Publish a measurement taken at Unix time t (default now) at QoS 1; returns the publish future"""
+        from awscrt import mqtt
+        now = time.time() if t is None else t
+        timestamp = utc_timestamp(now)
+        try:
+            start, before_weight, before_timestamp, end = self._payload_parts
+            payload = b''.join((
+                start, str(int(now)).encode('ascii'),
+                before_weight, repr(float(weight)).encode('ascii'),
+                before_timestamp, timestamp.encode('ascii'),
+                end
+            ))
+            
+            future, _ = self.mqtt_connection.publish(
+                topic=self._topic,
+                payload=payload,
+                qos=mqtt.QoS.AT_LEAST_ONCE
+            )
+            
+            self._pub_count += 1
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(f"Published {weight} kg to topic '{self._topic}'")
+            if self._pub_count & 1023 == 0:
+                logging.info(f"Published {self._pub_count} measurements")
+        except Exception as e:
+            logging.error(f"Error publishing measurement: {e}")
+            self.save_measurement(weight, timestamp, uploaded=False)
+            raise
+
+        return future
+
+    def publish_batch(self, samples):
+        """Publish a list of {'t': timestamp, 'w': weight} samples as a single QoS 1 message"""
+        from awscrt import mqtt
+        try:
+            payload = orjson.dumps({
+                'device_id': self.device_id,
+                'scale_id': self.device_id,
+                'unit': 'kg',
+                'samples': samples
+            })
+            # gzip's magic bytes (1f 8b) let the backend tell it apart from plain JSON
+            if self.compress:
+                payload = gzip.compress(payload, compresslevel=6)
+            logging.info(f"Publishing batch of {len(samples)} measurements to topic '{self._topic}'")
+            
+            future, _ = self.mqtt_connection.publish(
+                topic=self._topic,
+                payload=payload,
+                qos=mqtt.QoS.AT_LEAST_ONCE
+            )
+            logging.info("Batch published successfully")
+        except Exception as e:
+            logging.error(f"Error publishing batch: {e}")
+            for sample in samples:
+                self.save_measurement(sample['w'], sample['t'], uploaded=False)
+            raise
+
+        return future
+
+    def disconnect(self):
+        try:
+            disconnect_future = self.mqtt_connection.disconnect()
+            disconnect_future.result(timeout=10)
+            logging.info("Disconnected from AWS IoT")
+        except Exception as e:
+            logging.error(f"Error disconnecting: {e}")
+
+class MeasurementStore:
+    """SQLite queue of readings, drained to AWS IoT independently of the reads"""
+    __slots__ = ('path', '_conn', '_lock')
+
+    def __init__(self, path: str = QUEUE_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS measurements ('
+            'id INTEGER PRIMARY KEY, ts REAL NOT NULL, w REAL NOT NULL, '
+            'sent INTEGER NOT NULL DEFAULT 0)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS measurements_unsent ON measurements (sent, id)')
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def add(self, weight: float, t: float):
+        with self._lock:
+            self._conn.execute('INSERT INTO measurements (ts, w) VALUES (?, ?)', (t, weight))
+            self._conn.commit()
+
+    def unsent(self, limit: int, after_id: int = 0):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT id, ts, w FROM measurements WHERE sent = 0 AND id > ? ORDER BY id LIMIT ?',
+                (after_id, limit)
+            ).fetchall()
+
+    def mark_sent(self, ids):
+        with self._lock:
+            self._conn.executemany('UPDATE measurements SET sent = 1 WHERE id = ?', [(i,) for i in ids])
+            self._conn.execute('DELETE FROM measurements WHERE sent = 1 AND ts < ?',
+                               (time.time() - SENT_RETENTION_SECS,))
+            self._conn.commit()
+
+    def drain(self, iot_client: IoTClient, stop: threading.Event = None) -> int:
+        """Publish unsent readings, batched per the client's settings; returns how many were acknowledged"""
+        # Rows are only marked sent once AWS IoT has acknowledged them (PUBACK)
+        batch_size = min(max(iot_client.batch_size, 1), MAX_BATCH_SIZE)
+        # (rows, future) per publish, oldest first; only blocks once the window is full
+        inflight = deque()
+        sent = 0
+        last_id = 0
+        failed = False
+        try:
+            while not failed and not (stop is not None and stop.is_set()):
+                rows = self.unsent(batch_size, last_id)
+                if not rows:
+                    break
+                if batch_size > 1:
+                    # Hold a partial batch until its oldest reading is flush_interval old
+                    if len(rows) < batch_size and time.time() - rows[0][1] < iot_client.flush_interval:
+                        break
+                    future = iot_client.publish_batch([{'t': utc_timestamp(ts), 'w': w} for _, ts, w in rows])
+                else:
+                    _, ts, w = rows[0]
+                    future = iot_client.publish_measurement(w, t=ts)
+                inflight.append((rows, future))
+                last_id = rows[-1][0]
+                if len(inflight) >= MAX_INFLIGHT:
+                    acked = self._settle(iot_client, *inflight.popleft(), PUBACK_TIMEOUT)
+                    failed = acked is None
+                    sent += acked or 0
+        finally:
+            # Once one PUBACK has timed out the link is likely down; only collect
+            # the ones that already arrived rather than waiting on each in turn
+            while inflight:
+                acked = self._settle(iot_client, *inflight.popleft(), 0 if failed else PUBACK_TIMEOUT)
+                failed = failed or acked is None
+                sent += acked or 0
+        return sent
+
+    def _settle(self, iot_client: IoTClient, rows, future, timeout: float):
+        """Mark rows sent if their publish was acknowledged; returns the count, or None if it wasn't"""
+        try:
+            future.result(timeout=timeout)
+        except Exception as e:
+            # The rows stay unsent and are retried by the next drain
+            logging.error(f"No PUBACK for {len(rows)} queued measurement(s): {e}")
+            return None
+        self.mark_sent([row[0] for row in rows])
+        for _, ts, w in rows:
+            iot_client.save_measurement(w, utc_timestamp(ts), uploaded=True)
+        return len(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Weight frame parsing and HCI helpers, kept to the standard library so the BLE scripts can share them"""
+
+import re
+import errno
+import fcntl
+import socket
+import struct
+import logging
+import functools
+
+# Readings outside this range are treated as line noise
+MIN_WEIGHT = -1000.0
+MAX_WEIGHT = 1000.0
+
+# Weight frame sent by both the RS232 and BLE scales, e.g. "sg0012.34kg"
+_FRAME_RE = re.compile(rb'^\s*sg\s*([+-]?)\s*(\d*\.?\d+)\s*kg\s*$')
+
+def parse_frame(raw_data: bytes):
+    """Parse a raw 'sg<weight>kg' frame, returning None if it doesn't match"""
+    # Matched on the raw bytes so garbage frames are rejected without decoding
+    match = _FRAME_RE.match(raw_data)
+    if match is None:
+        return None
+    sign, value = match.groups()
+    weight = float(sign + value)
+    if not MIN_WEIGHT <= weight <= MAX_WEIGHT:
+        logging.warning(f"Weight out of range: {weight}kg")
+        return None
+    return weight
+
+# HCI ioctls and commands (see <bluetooth/hci.h>)
+HCIDEVUP = 0x400448c9
+HCIDEVDOWN = 0x400448ca
+HCISETSCAN = 0x400448dd
+SCAN_INQUIRY_PAGE = 0x03
+OGF_LE_CTL = 0x08
+OCF_LE_SET_ADVERTISING_PARAMETERS = 0x0006
+OCF_LE_SET_ADVERTISE_ENABLE = 0x000A
+
+def hci_command(sock, ogf, ocf, params=b''):
+    """Send a raw HCI command packet on a bound HCI socket"""
+    opcode = (ogf << 10) | ocf
+    sock.send(struct.pack('<BHB', 0x01, opcode, len(params)) + params)
+
+@functools.lru_cache(maxsize=None)
+def setup_bluetooth(hci_index=0):
+    """Reset and configure the HCI interface once per process.
+
+    Equivalent to `hciconfig hciN down/up/leadv 0/piscan`, done through
+    ioctls on an HCI socket instead of forking hciconfig for each step.
+    """
+    try:
+        with socket.socket(socket.AF_BLUETOOTH, socket.SOCK_RAW, socket.BTPROTO_HCI) as sock:
+            fcntl.ioctl(sock.fileno(), HCIDEVDOWN, hci_index)
+            try:
+                fcntl.ioctl(sock.fileno(), HCIDEVUP, hci_index)
+            except OSError as e:
+                if e.errno != errno.EALREADY:
+                    raise
+            sock.bind((hci_index,))
+
+            # leadv 0: connectable undirected advertising, then enable it
+            adv_params = struct.pack('<HHBBB6sBB', 0x0800, 0x0800, 0, 0, 0, bytes(6), 0x07, 0)
+            hci_command(sock, OGF_LE_CTL, OCF_LE_SET_ADVERTISING_PARAMETERS, adv_params)
+            hci_command(sock, OGF_LE_CTL, OCF_LE_SET_ADVERTISE_ENABLE, b'\x01')
+
+            # piscan: page + inquiry scan (struct hci_dev_req)
+            fcntl.ioctl(sock.fileno(), HCISETSCAN, struct.pack('HI', hci_index, SCAN_INQUIRY_PAGE))
+        logging.info("Bluetooth interface configured successfully")
+    except OSError as e:
+        logging.error(f"Error configuring Bluetooth: {e}")
+        raise
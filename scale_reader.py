@@ -3,120 +3,53 @@
 import os
 import sys
 import json
+import signal
 import logging
-import decimal
+import threading
 import argparse
-from decimal import Decimal
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import serial
-from awscrt import io, mqtt
-from awsiot import mqtt_connection_builder
 import time
-import json
 from bluepy.btle import Scanner, DefaultDelegate, Peripheral, BTLEDisconnectError
-import subprocess
-
-# Constants
-CONFIG_PATH = '/home/amitash/certs/config.json'
-CERTS_PATH = '/home/amitash/certs'
-LOG_PATH = '/tmp/scale.log'
-STAGE = 'prod'
-TOPIC = f"{STAGE}/{STAGE}/scale-measurements"
-
-def setup_logging():
-    """Configure logging"""
-    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
-    
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(LOG_PATH),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-
-class ScaleConfig:
-    """Configuration handler for scale reader"""
-    def __init__(self, device, config_path: str = CONFIG_PATH):
-        self.config_path = config_path
-        self.data = self._load_config(device)
-    
-    def _load_config(self, device) -> dict:
-        try:
-            logging.info(f"Loading configuration from {self.config_path}")
-            if not os.path.exists(self.config_path):
-                raise FileNotFoundError(f"Config file not found at {self.config_path}")
-            
-            with open(self.config_path, 'r') as f:
-                config = json.load(f)
-            
-            required_fields = [
-                'device_id',
-                'iot_endpoint',
-                'stage',
-            ]
-            if device == 'rs232':
-                required_fields += ['serial_port', 'baud_rate']
-            elif device == 'bluetooth':
-                required_fields += ['bluetooth_mac']
-            
-            missing = [field for field in required_fields if field not in config]
-            if missing:
-                raise ValueError(f"Missing required config fields: {missing}")
-            
-            return config
-                
-        except Exception as e:
-            logging.error(f"Failed to load config: {e}")
-            raise
+from scale_core import ScaleConfig, IoTClient, MeasurementStore, setup_logging
+from scale_protocol import parse_frame, setup_bluetooth
 
 class NotificationDelegate(DefaultDelegate):
+    __slots__ = ('last_weight', 'weight_received', 'weight_event')
+
     def __init__(self):
         DefaultDelegate.__init__(self)
         self.last_weight = None
         self.weight_received = False
+        self.weight_event = threading.Event()
 
     def handleNotification(self, cHandle, data):
         try:
-            logging.info(f"Received data: {data.hex()}")
-            logging.info("Data bytes: " + " ".join([f"{b:02x}" for b in data]))
-            
-            text_data = data.decode('ascii').strip()
-            logging.info(f"Decoded text: {text_data}")
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug("Received data: %s", data.hex(' '))
             
-            if text_data.startswith('sg') and text_data.endswith('kg'):
-                weight_str = text_data[2:-2]
-                self.last_weight = Decimal(weight_str)
+            weight = parse_frame(data)
+            if weight is not None:
+                self.last_weight = weight
                 logging.info(f"Parsed weight: {self.last_weight} kg")
                 self.weight_received = True
+                self.weight_event.set()
         except Exception as e:
             logging.error(f"Error parsing notification: {e}")
 
 class BluetoothScale:
     """Bluetooth Scale Handler"""
+    __slots__ = ('device_id', 'mac_address', 'connection_retries', 'retry_delay', '_notify_handle')
+
+    NOTIFY_CHARACTERISTIC_UUID = "0000ffe1-0000-1000-8000-00805f9b34fb"
+
     def __init__(self, device_id, mac_address):
         self.device_id = device_id
         self.mac_address = mac_address
-        self.NOTIFY_CHARACTERISTIC_UUID = "0000ffe1-0000-1000-8000-00805f9b34fb"
         self.connection_retries = 3
         self.retry_delay = 2
-
-    def setup_bluetooth(self):
-        try:
-            subprocess.run(['sudo', 'hciconfig', 'hci0', 'down'], check=True)
-            time.sleep(1)
-            subprocess.run(['sudo', 'hciconfig', 'hci0', 'up'], check=True)
-            time.sleep(1)
-            subprocess.run(['sudo', 'hciconfig', 'hci0', 'leadv', '0'], check=True)
-            subprocess.run(['sudo', 'hciconfig', 'hci0', 'noscan'], check=True)
-            time.sleep(1)
-            subprocess.run(['sudo', 'hciconfig', 'hci0', 'piscan'], check=True)
-            time.sleep(2)  # Added extra delay for stability
-            logging.info("Bluetooth interface configured successfully")
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Error configuring Bluetooth: {e}")
-            raise
+        self._notify_handle = None
+        setup_bluetooth()
 
     def discover_scale(self):
         """Verify the scale is available"""
@@ -142,14 +75,17 @@ class BluetoothScale:
         
         return False
 
+    def _find_notify_handle(self, peripheral):
+        """Look up the value handle of the notification characteristic"""
+        for service in peripheral.getServices():
+            for char in service.getCharacteristics():
+                if char.uuid == self.NOTIFY_CHARACTERISTIC_UUID:
+                    logging.info(f"Found notification characteristic: {char.uuid}")
+                    return char.valHandle
+        raise Exception("Notification characteristic not found")
+
     def read_weight(self):
         """Read weight from Bluetooth scale"""
-        self.setup_bluetooth()
-        
-        # First ensure scale is discoverable
-        if not self.discover_scale():
-            raise Exception("Scale not found after all retries")
-
         for attempt in range(self.connection_retries):
             peripheral = None
             try:
@@ -161,30 +97,31 @@ class BluetoothScale:
                 delegate = NotificationDelegate()
                 peripheral.withDelegate(delegate)
                 
-                services = peripheral.getServices()
-                for service in services:
-                    characteristics = service.getCharacteristics()
-                    for char in characteristics:
-                        if char.uuid == self.NOTIFY_CHARACTERISTIC_UUID:
-                            logging.info(f"Found notification characteristic: {char.uuid}")
-                            peripheral.writeCharacteristic(char.valHandle + 1, b"\x01\x00")
-                            logging.info("Enabled notifications")
-                            break
+                # The handle is stable per device, so only enumerate GATT services once
+                if self._notify_handle is None:
+                    self._notify_handle = self._find_notify_handle(peripheral)
+                peripheral.writeCharacteristic(self._notify_handle + 1, b"\x01\x00")
+                logging.info("Enabled notifications")
                 
                 logging.info("Subscribed to notifications. Please step on the scale...")
-                start_time = time.time()
-                while time.time() - start_time < 30:  # 30 second timeout
-                    if peripheral.waitForNotifications(1.0):
-                        if delegate.weight_received:
-                            return delegate.last_weight
+                # Block until the next notification instead of waking every second;
+                # only non-weight notifications bring us back around the loop
+                deadline = time.monotonic() + 30  # 30 second timeout
+                while not delegate.weight_event.is_set():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not peripheral.waitForNotifications(remaining):
+                        break
+                if delegate.weight_received:
+                    return delegate.last_weight
                 
                 logging.error("Timeout waiting for weight measurement")
                 
             except BTLEDisconnectError as e:
                 logging.error(f"Connection attempt {attempt + 1} failed with disconnect: {e}")
                 if attempt < self.connection_retries - 1:
-                    logging.info(f"Retrying connection in {self.retry_delay} seconds...")
-                    time.sleep(self.retry_delay)
+                    # The MAC comes from config, so only scan when a direct connect fails
+                    if not self.discover_scale():
+                        raise Exception("Scale not found after all retries")
                 else:
                     raise
             except Exception as e:
@@ -204,25 +141,65 @@ class BluetoothScale:
         raise Exception("Failed to read weight from scale after all retries")
 
 
+# The port is reopened for every sample, so report a missing low latency mode only once
+_low_latency_warned = False
+
 class SerialScale:
     """RS232 Scale Handler"""
-    def __init__(self, device_id, port, baud_rate):
+    __slots__ = ('port', 'baud_rate', 'serial', 'device_id', 'read_timeout')
+
+    def __init__(self, device_id, port, baud_rate, read_timeout=5):
         self.port = port
         self.baud_rate = baud_rate
         self.serial = None
         self.device_id = device_id
+        self.read_timeout = read_timeout
+
+    def _set_latency_timer(self):
+        """Drop the USB-serial latency timer from the default 16ms to 1ms"""
+        tty_name = os.path.basename(os.path.realpath(self.port))
+        path = f"/sys/bus/usb-serial/devices/{tty_name}/latency_timer"
+        try:
+            # The port is reopened every sample; only write when the value isn't already 1
+            with open(path, 'r') as f:
+                if f.read().strip() == '1':
+                    return
+            with open(path, 'w') as f:
+                f.write('1\n')
+            logging.debug(f"Set {path} to 1ms")
+        except OSError as e:
+            # Not every adapter exposes the knob, and it needs root
+            logging.debug(f"Could not set latency timer for {tty_name}: {e}")
 
     def __enter__(self):
         try:
+            self._set_latency_timer()
             logging.info(f"Opening serial port {self.port} at {self.baud_rate} baud")
             self.serial = serial.Serial(
                 port=self.port,
                 baudrate=self.baud_rate,
-                timeout=2,
+                # Short per-read timeout so read_weight's loop can check its own deadline
+                timeout=0.5,
+                # Return as soon as the scale goes quiet instead of waiting out the timeout
+                inter_byte_timeout=0.05,
                 bytesize=serial.EIGHTBITS,
                 parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE
+                stopbits=serial.STOPBITS_ONE,
+                xonxoff=False,
+                rtscts=False,
+                dsrdtr=False,
+                exclusive=True
             )
+            # ASYNC_LOW_LATENCY stops USB-serial bridges batching bytes for up to 16ms
+            try:
+                self.serial.set_low_latency_mode(True)
+            except (AttributeError, OSError, ValueError) as e:
+                global _low_latency_warned
+                if not _low_latency_warned:
+                    _low_latency_warned = True
+                    logging.warning(f"Low latency mode not available on {self.port}: {e}")
+                else:
+                    logging.debug(f"Low latency mode not available on {self.port}: {e}")
             return self
         except Exception as e:
             logging.error(f"Failed to connect to scale: {e}")
@@ -239,43 +216,33 @@ class SerialScale:
                 raise Exception("Serial port not initialized")
 
             self.serial.reset_input_buffer()
-            time.sleep(0.1)
             
-            max_attempts = 5
-            attempt = 0
-            
-            while attempt < max_attempts:
-                if self.serial.in_waiting > 0:
-                    raw_data = self.serial.readline()
-                    
-                    logging.info("=== Data Received ===")
-                    logging.info(f"Raw (hex): {' '.join([f'{b:02x}' for b in raw_data])}")
-                    logging.info(f"Raw (chr): {' '.join([chr(b) if 32 <= b <= 126 else '.' for b in raw_data])}")
-                    
-                    try:
-                        data = raw_data.decode('ascii').strip()
-                        logging.info(f"Decoded data: '{data}'")
-                        
-                        if data.startswith('sg') and data.endswith('kg'):
-                            weight_str = data[2:-2]
-                            sign = -1 if weight_str.startswith('-') else 1
-                            weight_str = weight_str[1:] if sign == -1 else weight_str
-                            weight = sign * Decimal(weight_str)
-                            logging.info(f"Parsed weight: {weight}kg")
-                            return {
-                                self.device_id: {
-                                    "scale_id": "scale-1",
-                                    "wight": weight,
-                                    "type": "RS232"
-                                }
-                            }
-                        else:
-                            logging.warning(f"Unexpected format: {data}")
-                    except Exception as decode_error:
-                        logging.error(f"Decoding error: {decode_error}")
-                        
-                attempt += 1
-                time.sleep(0.5)
+            # Accumulate until a full line arrives so frames split across a
+            # read timeout are joined rather than dropped
+            timeout = serial.Timeout(self.read_timeout)
+            buf = bytearray()
+            while not timeout.expired():
+                buf += self.serial.read_until(b'\n', 64)
+                if not buf.endswith(b'\n'):
+                    if len(buf) > 256:
+                        logging.warning(f"Discarding unterminated data: {bytes(buf)!r}")
+                        buf.clear()
+                    continue
+                raw_data = bytes(buf)
+                buf.clear()
+                
+                if logging.getLogger().isEnabledFor(logging.DEBUG):
+                    logging.debug("Raw (hex): %s", raw_data.hex(' '))
+                
+                try:
+                    weight = parse_frame(raw_data)
+                    if weight is not None:
+                        logging.info(f"Parsed weight: {weight}kg")
+                        return weight
+                    else:
+                        logging.warning(f"Unexpected format: {raw_data!r}")
+                except Exception as decode_error:
+                    logging.error(f"Decoding error: {decode_error}")
                 
             raise Exception("No valid weight data received")
                 
@@ -283,106 +250,53 @@ class SerialScale:
             logging.error(f"Read error: {e}")
             raise
 
-class IoTClient:
-    """Handles communication with AWS IoT"""
-    def __init__(self, device_id: str, endpoint: str, stage: str = STAGE):
-        self.device_id = device_id
-        self.endpoint = endpoint
-        self.stage = stage
-        self.mqtt_connection = self._create_mqtt_connection()
-        
-    def _create_mqtt_connection(self):
-        cert_files = {
-            'cert': f"{CERTS_PATH}/device.cert.pem",
-            'key': f"{CERTS_PATH}/device.private.key",
-            'root': f"{CERTS_PATH}/root-CA.crt"
-        }
-        
-        for name, path in cert_files.items():
-            if not os.path.exists(path):
-                raise FileNotFoundError(f"Missing {name} file: {path}")
-        
-        event_loop_group = io.EventLoopGroup(1)
-        host_resolver = io.DefaultHostResolver(event_loop_group)
-        client_bootstrap = io.ClientBootstrap(event_loop_group, host_resolver)
-        
-        return mqtt_connection_builder.mtls_from_path(
-            endpoint=self.endpoint,
-            cert_filepath=cert_files['cert'],
-            pri_key_filepath=cert_files['key'],
-            client_bootstrap=client_bootstrap,
-            ca_filepath=cert_files['root'],
-            client_id=f"device-{self.device_id}",
-            clean_session=False,
-            keep_alive_secs=30
-        )
-    
-    def connect(self):
-        connect_future = self.mqtt_connection.connect()
-        connect_future.result(timeout=10)
-        logging.info("Connected to AWS IoT")
-    
-    
-    def save_measurement(self, weight, timestamp, uploaded=False):
-        """Save measurement to local file"""
-        measurement = {
-            "weight": float(weight),
-            "timestamp": timestamp,
-            "unit": "kg",
-            "uploaded": uploaded
-        }
-        
-        # Create directory if it doesn't exist
-        os.makedirs("/tmp/measurements", exist_ok=True)
-        
-        # Save measurement with timestamp as filename
-        filename = f"/tmp/measurements/{timestamp.replace(':', '-')}.json"
-        with open(filename, 'w') as f:
-            json.dump(measurement, f)
-    def publish_measurement(self, weight: Decimal):
-        try:
-            topic = f"{self.stage}/{self.stage}/scale-measurements"
-            timestamp = datetime.utcnow().isoformat() + 'Z'
-            
-            message = {
-                'measurement_id': f"scale-1-{int(time.time())}",
-                'device_id': self.device_id,
-                'scale_id': self.device_id,
-                'weight': float(weight),
-                'timestamp': timestamp,
-                'unit': 'kg'
-            }
-            
-            logging.info(f"Publishing message to topic '{topic}': {json.dumps(message, indent=2)}")
-            
-            future, _ = self.mqtt_connection.publish(
-                topic=topic,
-                payload=json.dumps(message),
-                qos=mqtt.QoS.AT_LEAST_ONCE
-            )
-            
-            future.result(timeout=10)
-            logging.info("Measurement published successfully")
-            
-            # Save local copy
-            os.makedirs("/tmp/measurements", exist_ok=True)
-            filename = f"/tmp/measurements/{timestamp.replace(':', '-')}.json"
-            with open(filename, 'w') as f:
-                json.dump(message, f)
-            logging.info(f"Measurement saved to {filename}")
-                
-        except Exception as e:
-            logging.error(f"Error publishing measurement: {e}")
-            raise
 
-    def disconnect(self):
+INTERVAL_CONFIG_PATH = "/etc/scale-reader/interval.json"
+DEFAULT_INTERVAL = 60
+
+def load_interval():
+    """Read the sampling interval written by set_scale_interval.py"""
+    try:
+        with open(INTERVAL_CONFIG_PATH, 'r') as f:
+            config = json.load(f)
+        if 'seconds' in config:
+            return int(config['seconds'])
+        if 'minutes' in config:
+            return int(config['minutes']) * 60
+    except Exception:
+        pass
+    return DEFAULT_INTERVAL
+
+DRAIN_RETRY_INTERVAL = 60
+
+def _drain_loop(store, iot_client, wake):
+    """Publish queued readings when woken by a new sample, retrying periodically until _stop is set"""
+    while not _stop.is_set():
+        wake.wait(DRAIN_RETRY_INTERVAL)
+        wake.clear()
+        if _stop.is_set():
+            break
         try:
-            disconnect_future = self.mqtt_connection.disconnect()
-            disconnect_future.result(timeout=10)
-            logging.info("Disconnected from AWS IoT")
+            sent = store.drain(iot_client, _stop)
+            if sent:
+                logging.info(f"Published {sent} queued measurement(s)")
         except Exception as e:
-            logging.error(f"Error disconnecting: {e}")
+            logging.error(f"Failed to publish queued measurements: {e}")
+
+# Set by SIGTERM/SIGINT; the main loop finishes its current cycle and exits
+_stop = threading.Event()
 
+# Set by SIGHUP (and on stop) to cut the wait between samples short
+_wakeup = threading.Event()
+
+def _handle_stop(signum, frame):
+    logging.info(f"Received {signal.Signals(signum).name}, shutting down")
+    _stop.set()
+    _wakeup.set()
+
+def _handle_reload(signum, frame):
+    logging.info("Received SIGHUP, reloading the sampling interval")
+    _wakeup.set()
 
 def main():
     """Main function with device type selection"""
@@ -391,6 +305,9 @@ def main():
                       choices=['rs232', 'bluetooth'],
                       required=False,
                       help='Device type to use (rs232 or bluetooth)')
+    parser.add_argument('--once',
+                      action='store_true',
+                      help='Take a single measurement and exit (for cron-driven installs)')
 
     args = parser.parse_args()
     
@@ -403,31 +320,84 @@ def main():
         logging.info("Configuration loaded successfully")
         
         # Initialize IoT client
-        iot_client = IoTClient(config.data['device_id'], config.data['iot_endpoint'])
+        iot_client = IoTClient(config.data['device_id'], config.data['iot_endpoint'],
+                               batch_size=config.data.get('batch_size', 1),
+                               flush_interval=config.data.get('flush_interval', 300),
+                               compress=config.data.get('compress', False))
         logging.info("IoT client initialized")
         
-        # Connect to AWS IoT
-        iot_client.connect()
-        logging.info("Connected to AWS IoT")
+        # Readings are queued locally first so nothing is lost while offline
+        store = MeasurementStore()
+        wake = threading.Event()
+        drain_thread = None
+        
+        # Connect to AWS IoT once and keep the session for every sample. The
+        # TLS handshake runs in the background while the scale is set up and read.
+        executor = ThreadPoolExecutor(max_workers=1)
+        connect_future = executor.submit(iot_client.connect)
+        executor.shutdown(wait=False)
+        signal.signal(signal.SIGTERM, _handle_stop)
+        signal.signal(signal.SIGINT, _handle_stop)
+        signal.signal(signal.SIGHUP, _handle_reload)
         
         try:
-            # Choose device type based on argument
-            if args.device == 'rs232' or config.data["connection_type"] == 'rs232':
-                with SerialScale(config.data['device_id'], 
-                               config.data['serial_port'], 
-                               config.data['baud_rate']) as scale:
-                    weights = scale.read_weight()
-            else:  # bluetooth
-                scale = BluetoothScale(config.data['device_id'], 
-                                     config.data['bluetooth_mac'])
-                weights = scale.read_weight()
+            use_serial = args.device == 'rs232' or config.data["connection_type"] == 'rs232'
+            if not use_serial:
+                bluetooth_scale = BluetoothScale(config.data['device_id'], 
+                                                 config.data['bluetooth_mac'])
             
-            # Process weights
-            for scale_id, weight in weights.items():
-                iot_client.publish_measurement(weight["wight"])
-                logging.info(f"Measurement taken and published successfully from {config.data['connection_type']} device")
+            next_t = time.monotonic()
+            while not _stop.is_set():
+                weight = None
+                try:
+                    # Choose device type based on argument
+                    if use_serial:
+                        with SerialScale(config.data['device_id'], 
+                                       config.data['serial_port'], 
+                                       config.data['baud_rate']) as scale:
+                            weight = scale.read_weight()
+                    else:  # bluetooth
+                        weight = bluetooth_scale.read_weight()
+                except Exception as e:
+                    logging.error(f"Failed to read weight: {e}")
+                
+                if weight is not None:
+                    store.add(weight, time.time())
+                    wake.set()
+                    logging.info(f"Measurement taken from {config.data['connection_type']} device and queued")
+                
+                # A failed first connect is fatal, same as before
+                if connect_future is not None:
+                    connect_future.result()
+                    connect_future = None
+                    if not args.once:
+                        drain_thread = threading.Thread(target=_drain_loop, args=(store, iot_client, wake), daemon=True)
+                        drain_thread.start()
+                
+                if args.once:
+                    try:
+                        store.drain(iot_client)
+                    except Exception as e:
+                        logging.error(f"Failed to publish queued measurements: {e}")
+                    break
+                
+                # Re-read every cycle so set_scale_interval.py takes effect without a restart.
+                # Sleeping to a deadline keeps the cadence fixed regardless of read/publish time.
+                last_t = next_t
+                now = time.monotonic()
+                next_t = max(last_t + load_interval(), now)
+                while _wakeup.wait(next_t - now) and not _stop.is_set():
+                    # SIGHUP from set_scale_interval.py: reschedule from the last sample
+                    _wakeup.clear()
+                    now = time.monotonic()
+                    next_t = max(last_t + load_interval(), now)
                 
         finally:
+            # Let the drain thread settle its in-flight publishes before the connection goes away
+            if drain_thread is not None:
+                _stop.set()
+                wake.set()
+                drain_thread.join()
             iot_client.disconnect()
 
     except Exception as e:
@@ -1,5 +1,6 @@
-import requests
 import json
+import urllib3
+from urllib3.util.retry import Retry
 import logging
 from typing import Optional, Dict, Tuple
 from datetime import datetime, timedelta
@@ -13,6 +14,12 @@ class AuthManager:
     
     def __init__(self, config_path: str):
         self.config_path = config_path
+        self.pool = urllib3.PoolManager(
+            num_pools=1,
+            maxsize=2,
+            retries=Retry(total=2, backoff_factor=0.1),
+            timeout=urllib3.Timeout(connect=2, read=10)
+        )
         
     def authenticate(self, username: str, password: str) -> Tuple[bool, Optional[str], Optional[str]]:
         """
@@ -34,22 +41,23 @@ class AuthManager:
                 }
             }
             
-            response = requests.post(
+            response = self.pool.request(
+                'POST',
                 self.AUTH_ENDPOINT,
                 headers=headers,
-                json=payload,
-                timeout=10
+                body=json.dumps(payload).encode('utf-8')
             )
             
-            if response.status_code == 200:
-                auth_result = response.json().get('AuthenticationResult', {})
+            if response.status == 200:
+                auth_result = json.loads(response.data).get('AuthenticationResult', {})
                 id_token = auth_result.get('IdToken')
                 if id_token:
                     return True, id_token, None
                 return False, None, "No token in response"
             
-            error_msg = f"Authentication failed: {response.status_code} - {response.text}"
-            logging.error(f"Full response: {response.text}")
+            response_text = response.data.decode('utf-8', errors='replace')
+            error_msg = f"Authentication failed: {response.status} - {response_text}"
+            logging.error(f"Full response: {response_text}")
             return False, None, error_msg
             
         except Exception as e:
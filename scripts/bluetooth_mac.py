@@ -4,10 +4,14 @@ import asyncio
 from bleak import BleakClient, BleakScanner
 import struct
 import logging
-from datetime import datetime
 import json
 import os
-from typing import Optional
+import sys
+import time
+
+# Frame parsing is shared with the daemon in the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scale_protocol import parse_frame
 
 # Configure logging
 logging.basicConfig(
@@ -18,6 +22,9 @@ logging.basicConfig(
         logging.StreamHandler()
     ]
 )
+_log = logging.getLogger(__name__)
+
+SCALE_ADDR_CACHE = "/tmp/sh2492.addr"
 
 class SH2492Scale:
     def __init__(self):
@@ -26,42 +33,66 @@ class SH2492Scale:
         self.device = None
         self.client = None
         self.SCALE_NAME = "SH2492"
-        self.weight_event = asyncio.Event()
+        # Raw notifications; when full the oldest frame is dropped
+        self._q = asyncio.Queue(maxsize=8)
         self.last_weight = None
 
     def notification_handler(self, sender, data):
-        """Handle incoming notifications from the scale"""
+        """Queue incoming notifications; parsing happens in _next_weight"""
         try:
-            logging.info(f"Received data: {data.hex()}")
-            logging.info("Data bytes: " + " ".join([f"{b:02x}" for b in data]))
-            
-            # Decode the ASCII data
-            text_data = data.decode('ascii').strip()
-            logging.info(f"Decoded text: {text_data}")
-            
-            # Extract weight value - format is "sg0000.00kg"
-            if text_data.startswith('sg') and text_data.endswith('kg'):
-                weight_str = text_data[2:-2]  # Remove 'sg' and 'kg'
-                weight = float(weight_str)
-                logging.info(f"Parsed weight: {weight} kg")
+            self._q.put_nowait(data)
+        except asyncio.QueueFull:
+            self._q.get_nowait()
+            self._q.put_nowait(data)
+
+    async def _next_weight(self):
+        """Consume queued notifications until one parses as a weight"""
+        while True:
+            data = await self._q.get()
+            try:
+                if _log.isEnabledFor(logging.DEBUG):
+                    _log.debug("Received data: %s", data.hex(' '))
                 
-                self.last_weight = weight
-                self.weight_event.set()
-        except Exception as e:
-            logging.error(f"Error parsing notification: {e}")
+                weight = parse_frame(data)
+                if weight is not None:
+                    logging.info(f"Parsed weight: {weight} kg")
+                    self.last_weight = weight
+                    return weight
+            except Exception as e:
+                logging.error(f"Error parsing notification: {e}")
 
     async def discover_scale(self):
         """Scan for and find the SH2492 scale"""
-        logging.info("Scanning for SH2492 scale...")
-        devices = await BleakScanner.discover()
+        # Try the address found on a previous run before scanning by name
+        try:
+            with open(SCALE_ADDR_CACHE, 'r') as f:
+                cached_address = f.read().strip()
+        except OSError:
+            cached_address = None
         
-        for device in devices:
-            logging.info(f"Found device: {device.name} ({device.address})")
-            if device.name and self.SCALE_NAME in device.name:
+        if cached_address:
+            device = await BleakScanner.find_device_by_address(cached_address, timeout=3.0)
+            if device:
                 self.device = device
-                logging.info(f"Found scale: {device.name}")
+                logging.info(f"Found scale at cached address: {device.address}")
                 return True
-        return False
+        
+        logging.info("Scanning for SH2492 scale...")
+        device = await BleakScanner.find_device_by_filter(
+            lambda d, ad: bool(d.name) and self.SCALE_NAME in d.name,
+            timeout=10.0
+        )
+        if device is None:
+            return False
+        
+        self.device = device
+        logging.info(f"Found scale: {device.name} ({device.address})")
+        try:
+            with open(SCALE_ADDR_CACHE, 'w') as f:
+                f.write(device.address)
+        except OSError as e:
+            logging.warning(f"Could not cache scale address: {e}")
+        return True
 
     async def connect_and_wait_for_weight(self, timeout=30):
         """Connect to scale and wait for weight measurement"""
@@ -81,15 +112,14 @@ class SH2492Scale:
             
             # Wait for weight measurement or timeout
             try:
-                await asyncio.wait_for(self.weight_event.wait(), timeout)
-                return self.last_weight
+                return await asyncio.wait_for(self._next_weight(), timeout)
             except asyncio.TimeoutError:
                 logging.error("Timeout waiting for weight measurement")
                 return None
             finally:
                 await self.client.stop_notify(self.NOTIFY_CHARACTERISTIC_UUID)
 
-def save_measurement(weight: float, timestamp: str) -> None:
+def save_measurement(weight: float, timestamp: str, file_stem: str) -> None:
     """Save measurement to local file"""
     measurement = {
         "weight": weight,
@@ -98,7 +128,7 @@ def save_measurement(weight: float, timestamp: str) -> None:
     }
     
     os.makedirs("/tmp/measurements", exist_ok=True)
-    filename = f"/tmp/measurements/{timestamp.replace(':', '-')}.json"
+    filename = f"/tmp/measurements/{file_stem}.json"
     
     with open(filename, 'w') as f:
         json.dump(measurement, f)
@@ -118,8 +148,11 @@ async def main():
         weight = await scale.connect_and_wait_for_weight()
         
         if weight is not None:
-            timestamp = datetime.utcnow().isoformat() + 'Z'
-            save_measurement(weight, timestamp)
+            now = time.gmtime()
+            timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", now)
+            file_stem = time.strftime("%Y-%m-%dT%H-%M-%SZ", now)
+            # Keep file I/O off the event loop thread
+            await asyncio.get_running_loop().run_in_executor(None, save_measurement, weight, timestamp, file_stem)
             logging.info(f"Final weight reading: {weight} kg")
         
     except Exception as e:
@@ -3,11 +3,16 @@
 from bluepy.btle import Scanner, DefaultDelegate, Peripheral, BTLEDisconnectError
 import struct
 import logging
-from datetime import datetime
-import json
+import orjson
 import os
+import sys
 import time
-import subprocess
+import fcntl
+import socket
+
+# Frame parsing and HCI helpers are shared with the daemon in the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scale_protocol import parse_frame, setup_bluetooth, hci_command, OGF_LE_CTL
 
 # Configure logging
 logging.basicConfig(
@@ -18,6 +23,7 @@ logging.basicConfig(
         logging.StreamHandler()
     ]
 )
+_log = logging.getLogger(__name__)
 
 class NotificationDelegate(DefaultDelegate):
     def __init__(self):
@@ -27,39 +33,41 @@ class NotificationDelegate(DefaultDelegate):
 
     def handleNotification(self, cHandle, data):
         try:
-            logging.info(f"Received data: {data.hex()}")
-            logging.info("Data bytes: " + " ".join([f"{b:02x}" for b in data]))
-            
-            # Decode the ASCII data
-            text_data = data.decode('ascii').strip()
-            logging.info(f"Decoded text: {text_data}")
+            if _log.isEnabledFor(logging.DEBUG):
+                _log.debug("Received data: %s", data.hex(' '))
             
-            # Extract weight value - format is "sg0000.00kg"
-            if text_data.startswith('sg') and text_data.endswith('kg'):
-                weight_str = text_data[2:-2]  # Remove 'sg' and 'kg'
-                self.last_weight = float(weight_str)
+            weight = parse_frame(data)
+            if weight is not None:
+                self.last_weight = weight
                 logging.info(f"Parsed weight: {self.last_weight} kg")
                 self.weight_received = True
         except Exception as e:
             logging.error(f"Error parsing notification: {e}")
 
-def setup_bluetooth():
-    """Initialize Bluetooth on Raspberry Pi"""
+# HCI ioctls and commands only needed here (see <bluetooth/hci.h>)
+HCIGETCONNINFO = 0x800448d5
+LE_LINK = 0x80
+OCF_LE_CONN_UPDATE = 0x0013
+
+def request_fast_connection(mac_address, hci_index=0):
+    """Ask for a 7.5-15ms connection interval on the LE link to mac_address"""
     try:
-        # Reset bluetooth interface
-        subprocess.run(['sudo', 'hciconfig', 'hci0', 'down'], check=True)
-        time.sleep(1)
-        subprocess.run(['sudo', 'hciconfig', 'hci0', 'up'], check=True)
-        time.sleep(1)
-        # Set LE scan parameters
-        subprocess.run(['sudo', 'hciconfig', 'hci0', 'leadv', '0'], check=True)
-        subprocess.run(['sudo', 'hciconfig', 'hci0', 'noscan'], check=True)
-        time.sleep(1)
-        subprocess.run(['sudo', 'hciconfig', 'hci0', 'piscan'], check=True)
-        logging.info("Bluetooth interface reset and configured successfully")
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error resetting Bluetooth interface: {e}")
-        raise
+        with socket.socket(socket.AF_BLUETOOTH, socket.SOCK_RAW, socket.BTPROTO_HCI) as sock:
+            sock.bind((hci_index,))
+            
+            # struct hci_conn_info_req followed by room for one struct hci_conn_info
+            bdaddr = bytes.fromhex(mac_address.replace(':', ''))[::-1]
+            req = bytearray(bdaddr + bytes([LE_LINK]) + bytes(16))
+            fcntl.ioctl(sock.fileno(), HCIGETCONNINFO, req)
+            handle = struct.unpack_from('<H', req, 7)[0]
+            
+            # Interval 6-12 (x1.25ms), latency 0, supervision timeout 50 (x10ms)
+            hci_command(sock, OGF_LE_CTL, OCF_LE_CONN_UPDATE,
+                         struct.pack('<HHHHHHH', handle, 6, 12, 0, 50, 0, 0))
+        logging.info("Requested faster connection parameters")
+    except OSError as e:
+        # The scale is free to refuse; the default interval still works
+        logging.warning(f"Could not update connection parameters: {e}")
 
 class SH2492Scale:
     def __init__(self):
@@ -101,6 +109,7 @@ class SH2492Scale:
                 peripheral = Peripheral()
                 peripheral.connect(self.SCALE_MAC)
                 logging.info("Connected to scale")
+                request_fast_connection(self.SCALE_MAC)
                 
                 # Setup notification delegate
                 delegate = NotificationDelegate()
@@ -120,12 +129,15 @@ class SH2492Scale:
                 
                 logging.info("Subscribed to notifications. Please step on the scale...")
                 
-                # Wait for weight measurement
-                start_time = time.time()
-                while time.time() - start_time < timeout:
-                    if peripheral.waitForNotifications(1.0):
-                        if delegate.weight_received:
-                            return delegate.last_weight
+                # Block until the next notification instead of waking every second;
+                # only non-weight notifications bring us back around the loop
+                deadline = time.monotonic() + timeout
+                while not delegate.weight_received:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not peripheral.waitForNotifications(remaining):
+                        break
+                if delegate.weight_received:
+                    return delegate.last_weight
                 
                 logging.error("Timeout waiting for weight measurement")
                 return None
@@ -151,7 +163,7 @@ class SH2492Scale:
                     except:
                         pass
 
-def save_measurement(weight: float, timestamp: str) -> None:
+def save_measurement(weight: float, timestamp: str, file_stem: str) -> None:
     """Save measurement to local file"""
     measurement = {
         "weight": weight,
@@ -160,17 +172,16 @@ def save_measurement(weight: float, timestamp: str) -> None:
     }
     
     os.makedirs("/tmp/measurements", exist_ok=True)
-    filename = f"/tmp/measurements/{timestamp.replace(':', '-')}.json"
+    filename = f"/tmp/measurements/{file_stem}.json"
     
-    with open(filename, 'w') as f:
-        json.dump(measurement, f)
+    with open(filename, 'wb') as f:
+        f.write(orjson.dumps(measurement))
     logging.info(f"Measurement saved to {filename}")
 
 def main():
     try:
         # Setup Bluetooth
         setup_bluetooth()
-        time.sleep(2)  # Wait for Bluetooth to stabilize
         
         scale = SH2492Scale()
         
@@ -184,8 +195,10 @@ def main():
         weight = scale.connect_and_wait_for_weight()
         
         if weight is not None:
-            timestamp = datetime.utcnow().isoformat() + 'Z'
-            save_measurement(weight, timestamp)
+            now = time.gmtime()
+            timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", now)
+            file_stem = time.strftime("%Y-%m-%dT%H-%M-%SZ", now)
+            save_measurement(weight, timestamp, file_stem)
             logging.info(f"Final weight reading: {weight} kg")
         
     except Exception as e:
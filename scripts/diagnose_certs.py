@@ -4,10 +4,19 @@ import os
 import json
 import OpenSSL
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import serialization
 
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _public_key_der(key):
+    return key.public_bytes(serialization.Encoding.DER,
+                            serialization.PublicFormat.SubjectPublicKeyInfo)
+
 def diagnose_certificates(cert_dir="./certs", endpoint=None):
     """Diagnose common issues with AWS IoT certificates"""
     issues = []
@@ -22,61 +31,65 @@ def diagnose_certificates(cert_dir="./certs", endpoint=None):
     
     # Check certificate existence and permissions
     for name, path in cert_files.items():
-        if not os.path.exists(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
             issues.append(f"Missing {name} file: {path}")
             continue
             
-        perms = oct(os.stat(path).st_mode)[-3:]
-        if name == 'key' and perms != '600':
-            issues.append(f"Private key has incorrect permissions: {perms}. Should be 600.")
+        if name == 'key' and (st.st_mode & 0o777) != 0o600:
+            issues.append(f"Private key has incorrect permissions: {st.st_mode & 0o777:o}. Should be 600.")
     
     if issues:
         return issues, warnings
     
+    # Read the certificate and key concurrently; slow SD cards dominate otherwise
+    with ThreadPoolExecutor(2) as executor:
+        cert_future = executor.submit(_read, cert_files['cert'])
+        key_future = executor.submit(_read, cert_files['key'])
+    
     # Load and verify certificate
     try:
-        with open(cert_files['cert'], 'rb') as f:
-            cert_data = f.read()
-            cert = x509.load_pem_x509_certificate(cert_data, default_backend())
+        cert = x509.load_pem_x509_certificate(cert_future.result(), default_backend())
             
-        # Check expiration
-        now = datetime.datetime.now()
-        if cert.not_valid_after < now:
-            issues.append(f"Certificate has expired on {cert.not_valid_after}")
-        elif cert.not_valid_after < now + datetime.timedelta(days=30):
-            warnings.append(f"Certificate will expire soon: {cert.not_valid_after}")
+        # Check expiration (not_valid_after_utc needs cryptography >= 42)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        soon = now + datetime.timedelta(days=30)
+        if hasattr(cert, 'not_valid_after_utc'):
+            expires = cert.not_valid_after_utc
+        else:
+            expires = cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+        if expires < now:
+            issues.append(f"Certificate has expired on {expires}")
+        elif expires < soon:
+            warnings.append(f"Certificate will expire soon: {expires}")
             
         # Extract and verify certificate details
         if endpoint:
-            san_dns_names = []
             try:
-                for ext in cert.extensions:
-                    if ext.oid.dotted_string == '2.5.29.17':  # Subject Alternative Name
-                        san_dns_names = [name.value for name in ext.value if isinstance(name, x509.DNSName)]
+                try:
+                    san_dns_names = cert.extensions.get_extension_for_class(
+                        x509.SubjectAlternativeName
+                    ).value.get_values_for_type(x509.DNSName)
+                except x509.ExtensionNotFound:
+                    san_dns_names = []
                 
                 endpoint_base = endpoint.split('.')[0]
-                matching_sans = [san for san in san_dns_names if endpoint_base in san]
-                
-                if not matching_sans:
+                if not any(endpoint_base in san for san in san_dns_names):
                     issues.append(f"Certificate SANs {san_dns_names} don't match endpoint {endpoint}")
             except Exception as e:
                 warnings.append(f"Could not verify SAN names: {str(e)}")
         
         # Verify private key matches certificate
         try:
-            with open(cert_files['key'], 'rb') as f:
-                key_data = f.read()
-                private_key = serialization.load_pem_private_key(
-                    key_data,
-                    password=None,
-                    backend=default_backend()
-                )
-                
-            # Get public keys
-            cert_public_key = cert.public_key().public_numbers()
-            private_key_public = private_key.public_key().public_numbers()
+            private_key = serialization.load_pem_private_key(
+                key_future.result(),
+                password=None,
+                backend=default_backend()
+            )
             
-            if cert_public_key != private_key_public:
+            # Compare the encoded public keys rather than their big-int components
+            if _public_key_der(cert.public_key()) != _public_key_der(private_key.public_key()):
                 issues.append("Private key does not match certificate")
                 
         except Exception as e:
@@ -5,10 +5,16 @@ import sys
 import json
 import socket
 import ssl
+import functools
 import subprocess
 from urllib.parse import urlparse
 import boto3
 
+@functools.lru_cache(maxsize=None)
+def _iot():
+    """Return a process-wide IoT client so its connection pool is reused"""
+    return boto3.client('iot')
+
 def run_diagnostics(endpoint, cert_dir="/etc/scale-reader/certs", scale_id=None):
     """Run comprehensive AWS IoT connection diagnostics"""
     results = []
@@ -37,9 +43,10 @@ def run_diagnostics(endpoint, cert_dir="/etc/scale-reader/certs", scale_id=None)
     for name, filename in cert_files.items():
         path = os.path.join(cert_dir, filename)
         try:
-            with open(path, 'r') as f:
-                content = f.read().strip()
-                if content.startswith('-----BEGIN'):
+            # Only the PEM header is needed here; the SSL context loads the full files
+            with open(path, 'rb') as f:
+                head = f.read(32).lstrip()
+                if head.startswith(b'-----BEGIN'):
                     add_result(f"Certificate File ({name})", True, f"Valid certificate format in {path}")
                 else:
                     add_result(f"Certificate File ({name})", False, f"Invalid certificate format in {path}")
@@ -63,7 +70,7 @@ def run_diagnostics(endpoint, cert_dir="/etc/scale-reader/certs", scale_id=None)
     # 4. Check AWS IoT thing status if scale_id is provided
     if scale_id:
         try:
-            iot = boto3.client('iot')
+            iot = _iot()
             thing_name = f"scale-{scale_id}"
             thing = iot.describe_thing(thingName=thing_name)
             
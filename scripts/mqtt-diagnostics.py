@@ -2,6 +2,7 @@
 
 import os
 import json
+import asyncio
 import time
 import logging
 from awscrt import io, mqtt
@@ -31,21 +32,32 @@ def test_mqtt_connection(endpoint, cert_path, key_path, root_ca_path, client_id,
         f"diagnostic_{int(time.time())}"
     ]
     
-    for test_client_id in client_ids_to_test:
+    # Read the credentials and build the event loop once for every client ID
+    try:
+        with open(cert_path, 'rb') as f:
+            cert_bytes = f.read()
+        with open(key_path, 'rb') as f:
+            key_bytes = f.read()
+        with open(root_ca_path, 'rb') as f:
+            ca_bytes = f.read()
+    except OSError as e:
+        return [(test_client_id, f"Setup Error: {str(e)}") for test_client_id in client_ids_to_test]
+    
+    event_loop_group = io.EventLoopGroup(1)
+    host_resolver = io.DefaultHostResolver(event_loop_group)
+    client_bootstrap = io.ClientBootstrap(event_loop_group, host_resolver)
+    
+    async def test_client(test_client_id):
         if verbose:
-            print(f"\nTesting with client ID: {test_client_id}")
+            print(f"\n[{test_client_id}] Testing with client ID: {test_client_id}")
             
         try:
-            event_loop_group = io.EventLoopGroup(1)
-            host_resolver = io.DefaultHostResolver(event_loop_group)
-            client_bootstrap = io.ClientBootstrap(event_loop_group, host_resolver)
-            
-            mqtt_connection = mqtt_connection_builder.mtls_from_path(
+            mqtt_connection = mqtt_connection_builder.mtls_from_bytes(
                 endpoint=endpoint,
-                cert_filepath=cert_path,
-                pri_key_filepath=key_path,
+                cert_bytes=cert_bytes,
+                pri_key_bytes=key_bytes,
                 client_bootstrap=client_bootstrap,
-                ca_filepath=root_ca_path,
+                ca_bytes=ca_bytes,
                 client_id=test_client_id,
                 clean_session=True,
                 keep_alive_secs=30,
@@ -55,14 +67,14 @@ def test_mqtt_connection(endpoint, cert_path, key_path, root_ca_path, client_id,
             )
             
             if verbose:
-                print("Attempting to connect...")
+                print(f"[{test_client_id}] Attempting to connect...")
                 
             connect_future = mqtt_connection.connect()
             
             try:
-                connect_future.result(timeout=10)
+                await asyncio.wait_for(asyncio.wrap_future(connect_future), timeout=10)
                 if verbose:
-                    print("✅ Connection successful!")
+                    print(f"[{test_client_id}] ✅ Connection successful!")
                     
                 # Try a test publish
                 test_topic = "diagnostic/test"
@@ -73,37 +85,43 @@ def test_mqtt_connection(endpoint, cert_path, key_path, root_ca_path, client_id,
                 }
                 
                 if verbose:
-                    print(f"Attempting to publish to {test_topic}")
+                    print(f"[{test_client_id}] Attempting to publish to {test_topic}")
                     
                 publish_future, _ = mqtt_connection.publish(
                     topic=test_topic,
-                    payload=json.dumps(test_message),
+                    payload=json.dumps(test_message, separators=(",", ":")).encode("utf-8"),
                     qos=mqtt.QoS.AT_LEAST_ONCE
                 )
                 
-                publish_future.result(timeout=10)
+                await asyncio.wait_for(asyncio.wrap_future(publish_future), timeout=10)
                 if verbose:
-                    print("✅ Publish successful!")
+                    print(f"[{test_client_id}] ✅ Publish successful!")
                     
-            except TimeoutError:
+            except (TimeoutError, asyncio.TimeoutError):
                 if verbose:
-                    print("❌ Connection timed out")
+                    print(f"[{test_client_id}] ❌ Connection timed out")
                 results.append((test_client_id, "Connection timeout"))
             except Exception as e:
                 if verbose:
-                    print(f"❌ Connection failed: {str(e)}")
+                    print(f"[{test_client_id}] ❌ Connection failed: {str(e)}")
                 results.append((test_client_id, f"Error: {str(e)}"))
             finally:
                 if mqtt_connection:
                     disconnect_future = mqtt_connection.disconnect()
-                    disconnect_future.result(timeout=10)
+                    await asyncio.wait_for(asyncio.wrap_future(disconnect_future), timeout=10)
                     if verbose:
-                        print("Disconnected")
+                        print(f"[{test_client_id}] Disconnected")
                         
         except Exception as e:
             if verbose:
-                print(f"❌ Setup failed: {str(e)}")
+                print(f"[{test_client_id}] ❌ Setup failed: {str(e)}")
             results.append((test_client_id, f"Setup Error: {str(e)}"))
+    
+    async def test_all():
+        # The client IDs are independent, so connect them all at once
+        await asyncio.gather(*(test_client(test_client_id) for test_client_id in client_ids_to_test))
+    
+    asyncio.run(test_all())
             
     return results
 
@@ -31,14 +31,12 @@ def read_scale(port="/dev/ttyUSB0", baud_rate=1200, timeout=10):
         start_time = time.time()
         while (time.time() - start_time) < timeout:
             try:
-                # Check if data is available
-                if ser.in_waiting > 0:
-                    # Read data
-                    raw_data = ser.readline()
-                    
+                # Blocks until a full line arrives or the 1s port timeout expires
+                raw_data = ser.read_until(b'\n')
+                if raw_data:
                     # Print raw data in different formats
                     print("\n=== New Data Received ===")
-                    print("Raw (hex):", " ".join([f"{b:02x}" for b in raw_data]))
+                    print("Raw (hex):", raw_data.hex(" "))
                     print("Raw (dec):", " ".join([f"{b:3d}" for b in raw_data]))
                     print("Raw (chr):", " ".join([chr(b) if 32 <= b <= 126 else '.' for b in raw_data]))
                     
@@ -58,8 +56,6 @@ def read_scale(port="/dev/ttyUSB0", baud_rate=1200, timeout=10):
                     print("Length:", len(raw_data), "bytes")
                     print("=" * 30)
                 
-                time.sleep(0.1)  # Short sleep to prevent CPU overuse
-                
             except KeyboardInterrupt:
                 print("\nStopped by user")
                 break
@@ -3,12 +3,25 @@
 import boto3
 import json
 import os
+import shutil
 import argparse
+import urllib.request
 from botocore.exceptions import ClientError
 
+ROOT_CA_URL = "https://www.amazontrust.com/repository/AmazonRootCA1.pem"
+
+_IOT = None
+
+def _iot():
+    """Return a process-wide IoT client so its connection pool is reused"""
+    global _IOT
+    if _IOT is None:
+        _IOT = boto3.client('iot')
+    return _IOT
+
 def provision_scale(scale_id: str, output_dir: str):
     """Provision a new scale in AWS IoT"""
-    iot = boto3.client('iot')
+    iot = _iot()
     
     try:
         # Create thing
@@ -35,7 +48,9 @@ def provision_scale(scale_id: str, output_dir: str):
             f.write(cert_response['keyPair']['PrivateKey'])
             
         # Download root CA
-        os.system(f"curl https://www.amazontrust.com/repository/AmazonRootCA1.pem -o {output_dir}/root-CA.crt")
+        with urllib.request.urlopen(ROOT_CA_URL, timeout=10) as response, \
+                open(f"{output_dir}/root-CA.crt", 'wb') as f:
+            shutil.copyfileobj(response, f)
         
         # Attach policy
         iot.attach_policy(
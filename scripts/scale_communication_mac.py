@@ -1,5 +1,4 @@
 import serial
-import time
 import binascii
 
 def connect_to_scale(port='/dev/tty.PL2303G-USBtoUART1110', baudrate=1200):  # Changed to 1200
@@ -23,8 +22,9 @@ def connect_to_scale(port='/dev/tty.PL2303G-USBtoUART1110', baudrate=1200):  # C
 
 def read_weight(ser):
     try:
-        if ser.in_waiting:
-            raw_data = ser.readline()
+        # Blocks in the kernel until a full line or the port timeout
+        raw_data = ser.read_until(b'\n')
+        if raw_data:
             print(f"Raw bytes: {binascii.hexlify(raw_data)}")
             return raw_data.decode('latin-1')
         return None
@@ -44,7 +44,6 @@ def main():
             weight_data = read_weight(ser)
             if weight_data:
                 print(f"Data: {weight_data}")
-            time.sleep(1)
             
     except KeyboardInterrupt:
         print("\nStopping...")
@@ -5,6 +5,7 @@ import sys
 import json
 import time
 import logging
+import functools
 from awscrt import io, mqtt, auth
 from awsiot import mqtt_connection_builder
 from concurrent.futures import TimeoutError
@@ -31,6 +32,13 @@ class IoTTestCallbacks:
         else:
             logging.info(f"Publish succeeded for packet_id {packet_id} on topic {topic}")
 
+@functools.lru_cache(maxsize=None)
+def _client_bootstrap():
+    """Return the process-wide ClientBootstrap so reconnects reuse its threads and DNS cache"""
+    event_loop_group = io.EventLoopGroup(1)
+    host_resolver = io.DefaultHostResolver(event_loop_group, max_hosts=8)
+    return io.ClientBootstrap(event_loop_group, host_resolver)
+
 def test_connection(
     endpoint="alyu5ve98pej6-ats.iot.us-east-1.amazonaws.com",
     
@@ -54,32 +62,25 @@ def test_connection(
             'root': f"{cert_dir}/root-CA.crt"
         }
         
+        # Contents are left to mtls_from_path, which fails loudly on a bad file
         for name, path in cert_files.items():
-            if not os.path.exists(path):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
                 raise FileNotFoundError(f"Missing {name} file: {path}")
+            # Mode bits alone don't say whether this user can read it (e.g. a root-owned 0600 key)
             if not os.access(path, os.R_OK):
                 raise PermissionError(f"Cannot read {name} file: {path}")
-            logging.info(f"Found {name} file: {path}")
-            perms = oct(os.stat(path).st_mode)[-3:]
-            logging.info(f"File permissions for {name}: {perms}")
-            
-            with open(path, 'r') as f:
-                content = f.read().strip()
-                if not content:
-                    raise ValueError(f"{name} file is empty")
-                logging.debug(f"{name} file content length: {len(content)} characters")
-        
-        # Connection setup
-        event_loop_group = io.EventLoopGroup(1)
-        host_resolver = io.DefaultHostResolver(event_loop_group)
-        client_bootstrap = io.ClientBootstrap(event_loop_group, host_resolver)
+            if not st.st_size:
+                raise ValueError(f"{name} file is empty")
+            logging.info(f"Found {name} file: {path} ({st.st_size} bytes)")
         
         logging.info("Creating MQTT connection...")
         mqtt_connection = mqtt_connection_builder.mtls_from_path(
             endpoint=endpoint,
             cert_filepath=cert_files['cert'],
             pri_key_filepath=cert_files['key'],
-            client_bootstrap=client_bootstrap,
+            client_bootstrap=_client_bootstrap(),
             ca_filepath=cert_files['root'],
             client_id=client_id,
             clean_session=False,
@@ -116,7 +117,7 @@ def test_connection(
                 try:
                     publish_future, _ = mqtt_connection.publish(
                         topic=test_topic,
-                        payload=json.dumps(test_message),
+                        payload=json.dumps(test_message, separators=(",", ":")).encode("utf-8"),
                         qos=mqtt.QoS.AT_LEAST_ONCE
                     )
                     
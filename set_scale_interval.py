@@ -9,8 +9,9 @@ import logging
 from pathlib import Path
 
 # Constants
-SERVICE_NAME = "scale-reader.service"
 INTERVAL_CONFIG_PATH = "/etc/scale-reader/interval.json"
+MIN_INTERVAL = 10
+MAX_INTERVAL = 86400
 
 def setup_logging():
     """Configure logging"""
@@ -31,29 +32,41 @@ def load_config():
 
 def save_config(interval_type, seconds):
     """Save current configuration"""
+    config = {
+        "interval": interval_type,
+        "seconds": seconds
+    }
+    if load_config() == config:
+        return
+    
     os.makedirs(os.path.dirname(INTERVAL_CONFIG_PATH), exist_ok=True)
-    with open(INTERVAL_CONFIG_PATH, 'w') as f:
-        json.dump({
-            "interval": interval_type,
-            "seconds": seconds
-        }, f, indent=2)
+    # Write atomically so a power loss never leaves an empty config behind
+    tmp_path = INTERVAL_CONFIG_PATH + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(config, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, INTERVAL_CONFIG_PATH)
+
+def _validate(seconds):
+    """Return True if seconds is an allowed sampling interval"""
+    return MIN_INTERVAL <= seconds <= MAX_INTERVAL
 
-def update_service_timer(seconds):
-    """Update the service RestartSec parameter"""
+def notify_reader():
+    """Tell the running scale reader to pick up the new interval now"""
+    # Older versions kept a RestartSec override; the daemon schedules its own samples now
+    override_path = "/etc/systemd/system/scale-reader.service.d/override.conf"
     try:
-        # Create override directory if it doesn't exist
-        os.makedirs("/etc/systemd/system/scale-reader.service.d", exist_ok=True)
-        
-        # Create override file
-        override_content = f"""[Service]
-RestartSec={seconds}"""
-        
-        with open("/etc/systemd/system/scale-reader.service.d/override.conf", "w") as f:
-            f.write(override_content)
+        if os.path.exists(override_path):
+            os.unlink(override_path)
+            subprocess.run(["systemctl", "daemon-reload"], check=True)
         
-        # Reload systemd and restart service
-        subprocess.run(["systemctl", "daemon-reload"], check=True)
-        subprocess.run(["systemctl", "restart", SERVICE_NAME], check=True)
+        # SIGHUP cuts the reader's current wait short; if it isn't running it reads
+        # interval.json when it starts
+        result = subprocess.run(["systemctl", "kill", "-s", "HUP", "scale-reader.service"],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            logging.warning(f"Could not signal scale-reader: {result.stderr.strip()}")
         return True
     except Exception as e:
         logging.error(f"Failed to update service: {e}")
@@ -68,6 +81,8 @@ def main():
     group.add_argument('--fast', action='store_true', help='Set to fast mode (60 seconds)')
     group.add_argument('--slow', action='store_true', help='Set to slow mode (1800 seconds)')
     group.add_argument('--seconds', type=int, help='Set custom interval in seconds')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Validate the interval and print the config without saving it')
     
     args = parser.parse_args()
     
@@ -79,16 +94,22 @@ def main():
         interval_type = "SLOW"
         seconds = 1800
     else:
-        if args.seconds < 10 or args.seconds > 86400:
-            logging.error("Interval must be between 10 and 86400 seconds")
-            sys.exit(1)
         interval_type = "CUSTOM"
         seconds = args.seconds
     
-    # Update service
-    if update_service_timer(seconds):
-        # Save configuration
-        save_config(interval_type, seconds)
+    if not _validate(seconds):
+        logging.error(f"Interval must be between {MIN_INTERVAL} and {MAX_INTERVAL} seconds")
+        sys.exit(1)
+    
+    if args.dry_run:
+        # The reader re-reads interval.json every cycle, so saving would apply it
+        print(json.dumps({"interval": interval_type, "seconds": seconds}, indent=2))
+        logging.info(f"Dry run: {interval_type} ({seconds} seconds) not saved")
+        sys.exit(0)
+    
+    # Save first so the reader finds the new interval when it is woken
+    save_config(interval_type, seconds)
+    if notify_reader():
         logging.info(f"Successfully set sampling interval to {interval_type} ({seconds} seconds)")
         sys.exit(0)
     else:
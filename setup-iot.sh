@@ -76,6 +76,7 @@ print_status "Installing Python packages in virtual environment..."
 /opt/scale-reader/venv/bin/pip install \
     awsiotsdk \
     pyserial \
+    orjson \
     boto3 \
     psutil
 
@@ -84,6 +85,8 @@ check_status "Python package installation"
 # Copy scale reader script
 print_status "Installing scale reader script..."
 cp scale_reader.py /usr/local/bin/
+cp scale_core.py /usr/local/bin/
+python3 -m compileall -q /usr/local/bin/scale_core.py
 chmod +x /usr/local/bin/scale_reader.py
 
 check_status "Scale reader script installation"
@@ -148,7 +151,7 @@ print_status "Configuring cron jobs..."
 cat > /tmp/scale_crontab << EOL
 # Scale Reader cron jobs
 # Take measurement every 5 minutes (adjust interval as needed)
-*/5 * * * * /opt/scale-reader/venv/bin/python3 /usr/local/bin/scale_reader.py
+*/5 * * * * /opt/scale-reader/venv/bin/python3 /usr/local/bin/scale_reader.py --once
 
 # Log rotation and cleanup daily at 1 AM
 0 1 * * * find /var/log/scale-reader -name "*.log" -mtime +7 -exec rm {} \;
@@ -213,7 +216,7 @@ fi
 crontab -l > /tmp/current_crontab
 
 # Update the scale reader interval
-sed -i "/scale_reader.py/c\\*\/\$1 * * * * /opt/scale-reader/venv/bin/python3 /usr/local/bin/scale_reader.py" /tmp/current_crontab
+sed -i "/scale_reader.py/c\\*\/\$1 * * * * /opt/scale-reader/venv/bin/python3 /usr/local/bin/scale_reader.py --once" /tmp/current_crontab
 
 # Install updated crontab
 if crontab /tmp/current_crontab; then
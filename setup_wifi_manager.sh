@@ -67,6 +67,9 @@ print_status "Installing Python packages in virtual environment..."
 /opt/scale-reader/venv/bin/pip install --upgrade pip
 /opt/scale-reader/venv/bin/pip install \
     flask \
+    flask-caching \
+    flask-compress \
+    waitress \
     requests \
     werkzeug \
     awsiotsdk \